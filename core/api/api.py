@@ -1,37 +1,59 @@
 import logging
 import json
+from collections import OrderedDict
 from decimal import Decimal
 from functools import wraps
 
 from .models import (User,Spots,Images,Tags,TypesUserAction,
-	UserActions,SpotTags)
+	UserActions,SpotTags,ENRICHMENT_PENDING)
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
 from django.contrib.gis.geos import GEOSGeometry
 from django.contrib.gis.measure import Distance
-from rest_framework import viewsets, permissions
-from rest_framework.pagination import PageNumberPagination
+from django.db import transaction
+from django.utils import timezone
+from django.http import StreamingHttpResponse
+from rest_framework import viewsets, permissions, serializers
+from rest_framework.pagination import CursorPagination
+from rest_framework.renderers import JSONRenderer
 from rest_framework.permissions import IsAuthenticated
 from .serializers import (UserSerializer,SpotsSerializer,ImagesSerializer,
 	TagsSerializer,TypesUserActionSerializer,UserActionsSerializer,
 	SpotTagsSerializer,UserPlacesAPISerializer,PlaceInformationAPISerializer,
 	NearbyPlacesAPISerializer,CreateSpotAPISerializer,SpotDetailsAPISerializer,
-	EditSpotAPISerializer)
+	EditSpotAPISerializer,SpotTileAPISerializer,BoundingBoxAPISerializer,
+	ViewportClustersAPISerializer,BatchNearbyPlacesAPISerializer,
+	TagAutocompleteAPISerializer,PopularTagsAPISerializer,
+	BulkDeleteSpotsAPISerializer)
+from .renderers import (MVTRenderer,FastJSONRenderer,NearbyPolylineRenderer,
+	NearbyInt32Renderer,FirstRendererContentNegotiation)
+from .encoders import SPOT_FIELDS, GEOMETRY_FORMATS, spot_rows
+from .spatial import (nearest_spots,batch_nearby_spots,viewport_clusters,
+	viewport_features,filter_tags,encode_cursor)
+from .spatial_index import get_spots_index
+from .tiles import render_tile, invalidate_spot_tiles
+from .geocoding import reverse_geocode
+from .tag_search import autocomplete_tags, popular_tags
+from .deletion import soft_delete_spots
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.decorators import action
 
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut
-
 from core.settings import (max_distance,S3_ACCESS_KEY,S3_SECRET_KEY,
-	s3_bucket_name,s3_env_folder_name)
+	s3_bucket_name,s3_env_folder_name,spots_page_size_max)
 
 User = get_user_model()
 
-class StandardResultsSetPagination(PageNumberPagination):
+class KeysetResultsSetPagination(CursorPagination):
+	'''
+	Pages walked with a cursor on the id, newest first, over the alive
+	id indexes. There is no COUNT(*) nor OFFSET, so every page costs
+	the same
+	'''
 	page_size = 10
-	max_page_size = 1000
+	page_size_query_param = 'page_size'
+	max_page_size = spots_page_size_max
+	ordering = '-id'
 
 def validate_type_of_request(f):
 	'''
@@ -51,18 +73,78 @@ def validate_type_of_request(f):
 		return f(*args,**kwargs)
 	return decorator
 
-class SpotsViewSet(viewsets.ModelViewSet):
+def requested_fields(request, allowed):
+	'''
+	Fields asked with ?fields=id,name,... in the order of allowed,
+	always with the id. None when the parameter isn't sent. Raises
+	ValidationError with the fields that can't be requested
+	'''
+	value = request.query_params.get('fields')
+	if not value:
+		return None
+
+	fields = {field.strip() for field in value.split(',') if field.strip()}
+	unknown = fields - set(allowed)
+	if unknown:
+		raise serializers.ValidationError({
+			'fields': ['Unknown fields: %s' % ', '.join(sorted(unknown))]
+		})
+
+	fields.add('id')
+	return [field for field in allowed if field in fields]
+
+def requested_geometry(request):
+	'''
+	Geometry format asked with ?geometry=, ewkt by default. Raises
+	ValidationError when it isn't one of GEOMETRY_FORMATS
+	'''
+	value = request.query_params.get('geometry') or 'ewkt'
+	if value not in GEOMETRY_FORMATS:
+		raise serializers.ValidationError({
+			'geometry': ['Choose one of: %s' % ', '.join(GEOMETRY_FORMATS)]
+		})
+	return value
+
+class SparseFieldsetMixin(object):
+	'''
+	Lets the list and retrieve actions return only the fields asked
+	with ?fields=. The fields are passed down to the queryset with
+	only(), so the columns that aren't serialized (the geometries of a
+	narrow map request, or the columns the serializer excludes) are
+	never read
+	'''
+	sparse_actions = ['list', 'retrieve']
+
+	def serializer_fields(self):
+		if not hasattr(self, '_serializer_fields'):
+			allowed = list(self.get_serializer_class()().fields)
+			self._serializer_fields = requested_fields(self.request, allowed) or allowed
+		return self._serializer_fields
+
+	def get_queryset(self):
+		queryset = super().get_queryset()
+		if self.action not in self.sparse_actions:
+			return queryset
+
+		columns = {field.name for field in queryset.model._meta.concrete_fields}
+		return queryset.only(*[
+			field for field in self.serializer_fields() if field in columns
+		])
+
+	def get_serializer(self, *args, **kwargs):
+		if self.action in self.sparse_actions:
+			kwargs.setdefault('fields', self.serializer_fields())
+		return super().get_serializer(*args, **kwargs)
+
+class SpotsViewSet(SparseFieldsetMixin,viewsets.ModelViewSet):
 	'''
 	SpotsViewSet
 	'''
-	queryset = Spots.objects.filter(
-		is_active=True,
-		is_deleted=False
-	).order_by('id')
+	queryset = Spots.alive.order_by('id')
 	permission_classes = [
 		permissions.AllowAny
 	]	
-	pagination_class = StandardResultsSetPagination
+	pagination_class = KeysetResultsSetPagination
 
 	def __init__(self, *args, **kwargs):
 		self.response_data = {'error': [], 'data': []}
@@ -78,12 +160,42 @@ class SpotsViewSet(viewsets.ModelViewSet):
 			return PlaceInformationAPISerializer
 		if self.action in ['nearby_places']:
 			return NearbyPlacesAPISerializer
+		if self.action in ['batch_nearby_places']:
+			return BatchNearbyPlacesAPISerializer
 		if self.action in ['spot_details']:
 			return SpotDetailsAPISerializer
 		if self.action in ['edit_spot']:
 			return EditSpotAPISerializer			
+		if self.action in ['tiles']:
+			return SpotTileAPISerializer
+		if self.action in ['viewport_clusters']:
+			return ViewportClustersAPISerializer
+		if self.action in ['viewport_spots']:
+			return BoundingBoxAPISerializer
+		if self.action in ['bulk_delete_spots']:
+			return BulkDeleteSpotsAPISerializer
 		return SpotsSerializer
 
+	def get_renderers(self):
+		if self.action in ['tiles']:
+			return [MVTRenderer()]
+		if self.action in ['nearby_places']:
+			# Compact formats, chosen with the Accept header or ?format=
+			return super().get_renderers() + [
+				NearbyPolylineRenderer(),NearbyInt32Renderer()]
+		if self.action in ['user_places']:
+			return [FastJSONRenderer()] + [
+				renderer for renderer in super().get_renderers()
+				if not isinstance(renderer, JSONRenderer)
+			]
+		return super().get_renderers()
+
+	def get_content_negotiator(self):
+		# Also called while the request is initialized, before the action is set
+		if getattr(self, 'action', None) in ['tiles']:
+			return FirstRendererContentNegotiation()
+		return super().get_content_negotiator()
+
 	@validate_type_of_request
 	@action(methods=['post'], detail=False)
 	def user_places(self, request, *args, **kwargs):
@@ -91,20 +203,46 @@ class SpotsViewSet(viewsets.ModelViewSet):
 		- POST method: get the user places list of
 		the requested user
 		- Mandatory: user_id
+		- Optionals: ?fields=id,name,lat,lng (the id is always returned),
+		?geometry=ewkt|xy|geojson
+		- Optionals: page_size, cursor. When page_size is sent, get the
+		places newest first in pages, walked with next_cursor
 		'''
 		try:
 			serializer = UserPlacesAPISerializer(data=kwargs['data'])
 
 			if serializer.is_valid():
 
-				queryset = Spots.objects.filter(
-					is_active=True,
-					is_deleted=False,
+				try:
+					fields = requested_fields(request, SPOT_FIELDS) or SPOT_FIELDS
+					geometry = requested_geometry(request)
+				except serializers.ValidationError as e:
+					return Response(e.detail,status=status.HTTP_400_BAD_REQUEST)
+
+				queryset = Spots.alive.filter(
 					user=kwargs['data']['user']
 				).order_by('-id')
 
-				serializer = SpotsSerializer(queryset,many=True,required_fields=['user'])
-				self.data['spots']=json.loads(json.dumps(serializer.data))
+				page_size = serializer.validated_data.get('page_size')
+				if serializer.validated_data.get('cursor') is not None:
+					queryset = queryset.filter(id__lt=serializer.validated_data['cursor'])
+				if page_size:
+					# One more row tells if there is a next page
+					queryset = queryset[:page_size + 1]
+
+				# Plain rows encoded once, instead of the serializer fields
+				self.data['spots'] = spot_rows(queryset, fields, geometry)
+
+				if page_size:
+					self.data['next_cursor'] = None
+					if len(self.data['spots']) > page_size:
+						self.data['spots'] = self.data['spots'][:page_size]
+						self.data['next_cursor'] = encode_cursor(self.data['spots'][-1]['id'])
+
+				# Tags of all the spots with a single query
+				spots_tags = TagsViewSet().spots_tags([spot['id'] for spot in self.data['spots']])
+				for spot in self.data['spots']:
+					spot['tagList'] = spots_tags.get(spot['id'],[])
 				self.response_data['data'].append(self.data)
 				self.code = status.HTTP_200_OK
 
@@ -122,7 +260,8 @@ class SpotsViewSet(viewsets.ModelViewSet):
 	def place_information(self, request, *args, **kwargs):
 		'''
 		- POST method: get information about a place from
-		latitude and longitude using geopy
+		latitude and longitude using geopy. Answers are cached
+		by cells of rounded coordinates
 		- Mandatory: latitude, longitude
 		'''
 		try:
@@ -130,44 +269,10 @@ class SpotsViewSet(viewsets.ModelViewSet):
 
 			if serializer.is_valid():
 
-				self.data['place_information'] = {}
-				try:
-
-					geolocator = Nominatim(user_agent="My_django_google_maps_app",timeout=3)
-					location = geolocator.reverse(kwargs['data']['latitude']+", "+kwargs['data']['longitude'])
-
-					if(location):
-						try:
-							self.data['place_information']['country_name']=location.raw['address']['country']
-							self.data['place_information']['country_code']=location.raw['address']['country_code'].upper()
-						except Exception as e:
-							self.data['place_information']["country_name"]="undefined"
-							self.data['place_information']["country_code"]="undefined"
-						try:
-							self.data['place_information']['state_name']=location.raw['address']['state']
-						except Exception as e:
-							self.data['place_information']["state_name"]="undefined"
-						try:
-							self.data['place_information']['city_name']=location.raw['address']['city']
-						except Exception as e:
-							self.data['place_information']["city_name"]="undefined"
-						try:
-							self.data['place_information']['postal_code']=location.raw['address']['postcode']
-						except Exception as e:
-							self.data['place_information']["postal_code"]="undefined"
-						try:
-							self.data['place_information']['full_address']=location.raw['display_name']
-						except Exception as e:
-							self.data['full_address']="undefined"
-						self.code = status.HTTP_200_OK
-
-				except (GeocoderTimedOut) as e:
-					for i,j in data.items():
-						self.data['place_information'][i] = "undefined. Not found information"
-					# This also could be 204 to display some different
-					# message in front end layer
-					self.code = status.HTTP_200_OK
-					#self.code = status.HTTP_204_NO_CONTENT
+				self.data['place_information'] = reverse_geocode(
+					serializer.validated_data['lat'],
+					serializer.validated_data['lng']
+				)
 
 				self.response_data['data'].append(self.data)
 
@@ -187,6 +292,12 @@ class SpotsViewSet(viewsets.ModelViewSet):
 		- POST method: get the nearby places of
 		the requested user
 		- Mandatory: latitude, longitude, max distance, user_id
+		- Optionals: k, cursor. When k is sent, get the k nearest
+		places ordered by distance (in meters), paged with next_cursor
+		- Optionals: tags_any, tags_all, to only get the places with
+		any or all of these tags
+		- Optionals: ?format=polyline or ?format=int32 (or their Accept
+		media types) for the compact formats of the places
 		'''
 		try:
 			serializer = NearbyPlacesAPISerializer(data=kwargs['data'])
@@ -194,28 +305,151 @@ class SpotsViewSet(viewsets.ModelViewSet):
 			if serializer.is_valid():
 
 				self.data['nearby'] = []
+				tags_any = serializer.validated_data.get('tags_any')
+				tags_all = serializer.validated_data.get('tags_all')
 
-                # Transform current latitude and longitude of the user, in a geometry point
-				point_of_user = GEOSGeometry("POINT({} {})".format(kwargs['data']['longitude'],kwargs['data']['latitude']))
-                
-				if(Spots.objects.filter(
-					position__distance_lte=(point_of_user,Distance(km=max_distance)),
-					is_active=True,
-					is_deleted=False,
-					user=kwargs['data']['user']
-				).exists()):
-
-					# Get all the nearby places within a 5 km that match wit Spots of the current user
-					queryset = Spots.objects.filter(
-						position__distance_lte=(point_of_user,Distance(km=max_distance)),
-						is_active=True,
-						is_deleted=False
-					).values('lat','lng').order_by('id')
+				# The in-memory index doesn't know the tags of the spots,
+				# and the nearest neighbour mode doesn't use it
+				if tags_any or tags_all or serializer.validated_data.get('k'):
+					spots_index = None
+				else:
+					spots_index = get_spots_index()
+
+				if serializer.validated_data.get('k'):
+
+					point_of_user = GEOSGeometry("POINT({} {})".format(
+						serializer.validated_data['lng'],serializer.validated_data['lat']),srid=4326)
+
+					# Same gate as the radius search: the user must have
+					# a place within max_distance
+					if not Spots.alive.filter(
+						position_geog__dwithin=(point_of_user,Distance(km=serializer.validated_data['max_distance'])),
+						user=serializer.validated_data['user']
+					).exists():
+						self.code = status.HTTP_204_NO_CONTENT
+
+					else:
+						# Nearest neighbour mode: a single query driven by the
+						# spatial index, instead of a radius scan
+						self.data['nearby'], self.data['next_cursor'] = nearest_spots(
+							serializer.validated_data['lat'],
+							serializer.validated_data['lng'],
+							serializer.validated_data['k'],
+							serializer.validated_data['max_distance'],
+							serializer.validated_data.get('cursor'),
+							tags_any,
+							tags_all
+						)
+
+						if not self.data['nearby']:
+							self.code = status.HTTP_204_NO_CONTENT
+
+				elif spots_index is not None:
+
+					# Answer the radius search from the in-memory index of this worker
+					nearby = spots_index.nearby_places(
+						serializer.validated_data['lat'],
+						serializer.validated_data['lng'],
+						max_distance,
+						kwargs['data']['user']
+					)
 
-					for i in queryset:
-						self.data['nearby'].append(i)
+					if nearby is not None:
+						self.data['nearby'] = nearby
+					else:
+						self.code = status.HTTP_204_NO_CONTENT
 
 				else:
+
+					# Transform current latitude and longitude of the user, in a geometry point
+					point_of_user = GEOSGeometry("POINT({} {})".format(kwargs['data']['longitude'],kwargs['data']['latitude']),srid=4326)
+
+					# ST_DWithin over the geography column measures meters
+					# and is answered by its GiST index
+					if(Spots.alive.filter(
+						position_geog__dwithin=(point_of_user,Distance(km=max_distance)),
+						user=kwargs['data']['user']
+					).exists()):
+
+						# Get all the nearby places within a 5 km that match wit Spots of the current user
+						queryset = filter_tags(Spots.alive.filter(
+							position_geog__dwithin=(point_of_user,Distance(km=max_distance))
+						),tags_any,tags_all).values('id','lat','lng').order_by('id')
+
+						for i in queryset:
+							self.data['nearby'].append(i)
+
+					else:
+						self.code = status.HTTP_204_NO_CONTENT
+
+				self.response_data['data'].append(self.data)
+
+			else:
+				return Response(serializer.errors,status=status.HTTP_400_BAD_REQUEST)
+
+		except Exception as e:
+			logging.getLogger('error_logger').exception("[API - SpotsViewSet] - Error: " + str(e))
+			self.code = status.HTTP_500_INTERNAL_SERVER_ERROR
+			self.response_data['error'].append("[API - SpotsViewSet] - Error: " + str(e))
+		return Response(self.response_data,status=self.code)
+
+	@validate_type_of_request
+	@action(methods=['post'], detail=False)
+	def batch_nearby_places(self, request, *args, **kwargs):
+		'''
+		- POST method: get the nearby places of several coordinates
+		(e.g. the points of a trip) with a single query. The places of
+		each probe are keyed by its position in the list, nearest first
+		- Mandatory: probes, a list of latitude, longitude, max_distance
+		- Optionals: tags_any, tags_all
+		'''
+		try:
+			serializer = BatchNearbyPlacesAPISerializer(data=kwargs['data'])
+
+			if serializer.is_valid():
+
+				self.data['nearby'], self.data['truncated'] = batch_nearby_spots(
+					serializer.validated_data['probes'],
+					serializer.validated_data.get('tags_any'),
+					serializer.validated_data.get('tags_all')
+				)
+				self.response_data['data'].append(self.data)
+
+			else:
+				return Response(serializer.errors,status=status.HTTP_400_BAD_REQUEST)
+
+		except Exception as e:
+			logging.getLogger('error_logger').exception("[API - SpotsViewSet] - Error: " + str(e))
+			self.code = status.HTTP_500_INTERNAL_SERVER_ERROR
+			self.response_data['error'].append("[API - SpotsViewSet] - Error: " + str(e))
+		return Response(self.response_data,status=self.code)
+
+	@validate_type_of_request
+	@action(methods=['post'], detail=False)
+	def viewport_clusters(self, request, *args, **kwargs):
+		'''
+		- POST method: get the clusters of active spots inside the
+		viewport of the map, with their count and centroid. The size
+		of the clusters depends on the zoom level
+		- Mandatory: min_lat, min_lng, max_lat, max_lng, zoom
+		- Optionals: tags_any, tags_all
+		'''
+		try:
+			serializer = ViewportClustersAPISerializer(data=kwargs['data'])
+
+			if serializer.is_valid():
+
+				self.data['clusters'] = viewport_clusters(
+					serializer.validated_data['min_lat'],
+					serializer.validated_data['min_lng'],
+					serializer.validated_data['max_lat'],
+					serializer.validated_data['max_lng'],
+					serializer.validated_data['zoom'],
+					serializer.validated_data.get('tags_any'),
+					serializer.validated_data.get('tags_all')
+				)
+
+				if not self.data['clusters']:
 					self.code = status.HTTP_204_NO_CONTENT
 
 				self.response_data['data'].append(self.data)
@@ -229,28 +463,113 @@ class SpotsViewSet(viewsets.ModelViewSet):
 			self.response_data['error'].append("[API - SpotsViewSet] - Error: " + str(e))
 		return Response(self.response_data,status=self.code)
 
+	@validate_type_of_request
+	@action(methods=['post'], detail=False)
+	def viewport_spots(self, request, *args, **kwargs):
+		'''
+		- POST method: get a GeoJSON FeatureCollection with the active
+		spots inside the viewport of the map, streamed from a server
+		side cursor
+		- Mandatory: min_lat, min_lng, max_lat, max_lng
+		- Optionals: tags_any, tags_all
+		'''
+		try:
+			serializer = BoundingBoxAPISerializer(data=kwargs['data'])
+
+			if serializer.is_valid():
+
+				return StreamingHttpResponse(
+					viewport_features(
+						serializer.validated_data['min_lat'],
+						serializer.validated_data['min_lng'],
+						serializer.validated_data['max_lat'],
+						serializer.validated_data['max_lng'],
+						serializer.validated_data.get('tags_any'),
+						serializer.validated_data.get('tags_all')
+					),
+					content_type='application/geo+json'
+				)
+
+			else:
+				return Response(serializer.errors,status=status.HTTP_400_BAD_REQUEST)
+
+		except Exception as e:
+			logging.getLogger('error_logger').exception("[API - SpotsViewSet] - Error: " + str(e))
+			self.code = status.HTTP_500_INTERNAL_SERVER_ERROR
+			self.response_data['error'].append("[API - SpotsViewSet] - Error: " + str(e))
+		return Response(self.response_data,status=self.code)
+
+	@validate_type_of_request
+	@action(methods=['get'], detail=False)
+	def tiles(self, request, *args, **kwargs):
+		'''
+		- GET method: get a Mapbox Vector Tile with the active spots
+		inside the tile requested, with their tags as a comma
+		separated property
+		- Mandatory: z, x, y
+		'''
+		try:
+			serializer = SpotTileAPISerializer(data=kwargs['data'])
+
+			if serializer.is_valid():
+
+				tile = render_tile(
+					serializer.validated_data['z'],
+					serializer.validated_data['x'],
+					serializer.validated_data['y']
+				)
+				return Response(tile,status=status.HTTP_200_OK)
+
+			else:
+				return Response(serializer.errors,status=status.HTTP_400_BAD_REQUEST,content_type='application/json')
+
+		except Exception as e:
+			logging.getLogger('error_logger').exception("[API - SpotsViewSet] - Error: " + str(e))
+			self.code = status.HTTP_500_INTERNAL_SERVER_ERROR
+			self.response_data['error'].append("[API - SpotsViewSet] - Error: " + str(e))
+		return Response(self.response_data,status=self.code,content_type='application/json')
+
 	@validate_type_of_request
 	@action(methods=['post'], detail=False)
 	def create_spot(self, request, *args, **kwargs):
 		'''
 		- POST method: create a new place
 		- Mandatory: 
-		- Optionals: tag list, image list
+		- Optionals: tag list, image list, defer_enrichment
+		- With defer_enrichment the address fields can be omitted, the place
+		  is saved as pending and the enrich_spots command geocodes it later
 		'''
 		try:
+			defer_enrichment = kwargs['data'].get('defer_enrichment') in serializers.BooleanField.TRUE_VALUES
+
+			if defer_enrichment:
+				required_fields = ['name','lat','lng']
+				optional_fields = ['country','country_code','state','city','full_address','postal_code']
+			else:
+				required_fields = ['name','country','country_code','state','city','full_address','postal_code','lat','lng']
+				optional_fields = None
+
 			serializer = CreateSpotAPISerializer(
 				data=kwargs['data'],
-				required_fields=['name','country','country_code','state','city','full_address','postal_code','lat','lng'])
+				required_fields=required_fields,
+				optional_fields=optional_fields)
 
 			if serializer.is_valid():
-				serializer = SpotsSerializer(data=kwargs['data'])
+				serializer = SpotsSerializer(data=kwargs['data'],optional_fields=optional_fields)
 
 				if serializer.is_valid():
-					serializer.save()
+					if defer_enrichment:
+						serializer.save(enrichment_status=ENRICHMENT_PENDING)
+					else:
+						serializer.save()
 
 					if kwargs['data']['tag_list']:
 
-						SpotTagsViewSet().create_spot_tags(serializer.id,kwargs['data']['tag_list'])
+						SpotTagsViewSet().create_spot_tags(serializer.instance.id,kwargs['data']['tag_list'])
+
+						# The cached tiles were refreshed when the spot was saved,
+						# before its tags existed
+						invalidate_spot_tiles(serializer.instance)
 
 	                # if request.POST.get('image'):
 
@@ -300,57 +619,46 @@ class SpotsViewSet(viewsets.ModelViewSet):
 
 			if serializer.is_valid():
 
-				spot = Spots.objects.get(id=request.POST.get('spot_id'))
-				spot.is_active = False
-				spot.is_deleted = True
-				spot.save()
-
-				'''If an user action list exist for the current spot with 
-				type_user_action equal to 'Spot Tag', delete it'''
-				if(UserActions.objects.filter(
-					spot_id=request.POST.get('spot_id'),
-					is_active=True,
-					is_deleted=False,
-					type_user_action_id=1
-				).exists()):
-
-					user_action = UserActions.objects.get(
-						spot_id=request.POST.get('spot_id'),
-						type_user_action_id=1,
-						is_active=True,
-						is_deleted=False
-					)
-					user_action.is_active = False
-					user_action.is_deleted = True
-					user_action.save()
-
-					# Then, delete the spot_tag list related
-					spot_tag_list = SpotTags.objects.filter(
-						user_action_id=user_action.id,
-						is_active=True,
-						is_deleted=False
-					)
-					spot_tag_list.update(is_active=False,is_deleted=True)
+				# Delete the spot with its user actions, spot tags, images
+				# and the tags that don't exist for any other spot
+				deleted_spots = soft_delete_spots([kwargs['data']['spot_id']])
 
-					# Finally, check if it's necessary to delete any tag
-					spot_tag_list = SpotTags.objects.filter(
-						user_action_id=user_action.id,
-						is_active=True,
-						is_deleted=False
-					)
+				if not deleted_spots:
+					self.code = status.HTTP_404_NOT_FOUND
+					self.response_data['error'].append("[API - SpotsViewSet] - Error: Spot not found")
+					return Response(self.response_data,status=self.code)
 
-					for current_spot_tag in spot_tag_list:
+				spot = deleted_spots[0]
+				self.data['placeName'] = spot.name
 
-						# If the current tag doesn't exists for any other spot, delete it
-						if len(SpotTags.objects.filter(tag_id=current_spot_tag.tag_id,is_active=True,is_deleted=False)) == 1:
+				self.response_data['data'].append(self.data)
+				self.code = status.HTTP_200_OK
 
-							tag = Tags.objects.get(id=current_spot_tag.tag_id)
-							tag.is_active = False                    
-							tag.is_deleted = True
-							tag.save()
+			else:
+				return Response(serializer.errors,status=status.HTTP_400_BAD_REQUEST)
 
-				self.data['placeName'] = spot.name
+		except Exception as e:
+			logging.getLogger('error_logger').exception("[API - SpotsViewSet] - Error: " + str(e))
+			self.code = status.HTTP_500_INTERNAL_SERVER_ERROR
+			self.response_data['error'].append("[API - SpotsViewSet] - Error: " + str(e))
+		return Response(self.response_data,status=self.code)
 
+	@validate_type_of_request
+	@action(methods=['post'], detail=False)
+	def bulk_delete_spots(self, request, *args, **kwargs):
+		'''
+		- POST method: delete a list of spots with all the instances
+		related, in a single transaction
+		- Mandatory: spot_ids
+		'''
+		try:
+			serializer = BulkDeleteSpotsAPISerializer(data=kwargs['data'])
+
+			if serializer.is_valid():
+
+				deleted_spots = soft_delete_spots(serializer.validated_data['spot_ids'])
+
+				self.data['deleted'] = [spot.id for spot in deleted_spots]
 				self.response_data['data'].append(self.data)
 				self.code = status.HTTP_200_OK
 
@@ -376,9 +684,7 @@ class SpotsViewSet(viewsets.ModelViewSet):
 			if serializer.is_valid():
 
 				try:
-					queryset = get_object_or_404(Spots,
-						is_active=True,
-						is_deleted=False,
+					queryset = get_object_or_404(Spots.alive,
 						id=kwargs['data']['spot_id']
 					)
 
@@ -418,9 +724,7 @@ class SpotsViewSet(viewsets.ModelViewSet):
 				try:
 
 					# Validate if spot exist
-					spot = get_object_or_404(Spots,
-						is_active=True,
-						is_deleted=False,
+					spot = get_object_or_404(Spots.alive,
 						id=kwargs['data']['spot_id']
 					)
 
@@ -435,20 +739,12 @@ class SpotsViewSet(viewsets.ModelViewSet):
 				else:
 					self.data['name'] = spot.name
 
-				tags_to_delete = []
-				tags_to_delete = TagsViewSet().list_tags_to_delete(spot.id,kwargs['data']['tags'])
+				# Delete the tags left out and append the new ones at once
+				self.data['tags_deleted'], self.data['new_tags'] = SpotTagsViewSet().sync_spot_tags(
+					spot.id,kwargs['data']['tags'])
 
-				# Tags to delete?
-				if tags_to_delete:
-					self.data['tags_deleted'] = SpotTagsViewSet().remove_spot_tags(kwargs['data']['spot_id'],tags_to_delete)
-				else:
-					self.data['tags_deleted'] = []
-
-				# Tags to append?
-				if kwargs['data']['tags']:
-					self.data['new_tags'] = SpotTagsViewSet().create_spot_tags(spot.id,kwargs['data']['tags'])
-				else:
-					self.data['new_tags'] = []
+				# Tags are a property of the spot in the map tiles
+				invalidate_spot_tiles(spot)
 
 				self.response_data['data'].append(self.data)
 				self.code = status.HTTP_200_OK
@@ -469,116 +765,129 @@ class UserViewSet(viewsets.ModelViewSet):
 	]
 	serializer_class = UserSerializer
 
-class ImagesViewSet(viewsets.ModelViewSet):
-	queryset = Images.objects.filter(
-		is_active=True,
-		is_deleted=False
-	).order_by('id')
+class ImagesViewSet(SparseFieldsetMixin,viewsets.ModelViewSet):
+	queryset = Images.alive.order_by('id')
 	permission_classes = [
 		permissions.AllowAny
 	]
 	serializer_class = ImagesSerializer
+	pagination_class = KeysetResultsSetPagination
 
-class TagsViewSet(viewsets.ModelViewSet):
-	queryset = Tags.objects.filter(
-		is_active=True,
-		is_deleted=False
-	).order_by('id')
+class TagsViewSet(SparseFieldsetMixin,viewsets.ModelViewSet):
+	queryset = Tags.alive.order_by('id')
 	permission_classes = [
 		permissions.AllowAny
 	]
 	serializer_class = TagsSerializer
-	pagination_class = StandardResultsSetPagination
+	pagination_class = KeysetResultsSetPagination
 
-	def list_tags(self,spot_id):
+	def get_serializer_class(self):
+		if self.action in ['autocomplete']:
+			return TagAutocompleteAPISerializer
+		if self.action in ['popular']:
+			return PopularTagsAPISerializer
+		return TagsSerializer
+
+	@validate_type_of_request
+	@action(methods=['get'], detail=False)
+	def autocomplete(self, request, *args, **kwargs):
 		'''
-		Function to list all tags related with the spot requested
+		- GET method: suggest active tags that start with the query,
+		or are similar to it, the most used first
+		- Mandatory: query
+		- Optionals: limit
 		'''
+		response_data = {'error': [], 'data': []}
+		code = status.HTTP_200_OK
 		try:
-			tag_list = []
-
-			# Check if the spot requested has any tag
-			user_action = get_object_or_404(UserActions,
-				spot_id=spot_id,
-				type_user_action_id=1,
-				is_active=True,
-				is_deleted=False
-			)
-
-			# Get all the spot tag list related with the user action
-			spot_tag_list = SpotTags.objects.filter(
-				user_action_id=user_action.id,
-				is_active=True,
-				is_deleted=False
-			)
-
-			# Finally, get all the tags related with the spot 
-			for current_spot_tag in spot_tag_list:
-
-				tag = Tags.objects.get(id=current_spot_tag.tag_id)
-				tag_list.append(tag.name)
-
-		# It wasn't found a spot_tag user action related with the spot_id
-		# or the spot_tag user action isn't related with a tag, because
-		# any tag was previously deleted 
-		except Exception as e:
-			pass
+			serializer = TagAutocompleteAPISerializer(data=kwargs.get('data',{}))
+
+			if serializer.is_valid():
+
+				response_data['data'].append({
+					'tags': autocomplete_tags(
+						serializer.validated_data['query'],
+						serializer.validated_data['limit']
+					)
+				})
+
+			else:
+				return Response(serializer.errors,status=status.HTTP_400_BAD_REQUEST)
 
-		return tag_list
+		except Exception as e:
+			logging.getLogger('error_logger').exception("[API - TagsViewSet] - Error: " + str(e))
+			code = status.HTTP_500_INTERNAL_SERVER_ERROR
+			response_data['error'].append("[API - TagsViewSet] - Error: " + str(e))
+		return Response(response_data,status=code)
 
-	def list_tags_to_delete(self,spot_id,tag_list):
-		'''	
-		This function return the tags to delete from tag_list,
-		according if any tag exist or not and is related with
-		the spot_id, so the rest of the tags will keep
+	@validate_type_of_request
+	@action(methods=['get'], detail=False)
+	def popular(self, request, *args, **kwargs):
 		'''
-		tags_to_delete = []
+		- GET method: get the most used tags, from their usage counters
+		- Optionals: limit, and latitude, longitude, max_distance to
+		only count the tags of the places within the radius
+		'''
+		response_data = {'error': [], 'data': []}
+		code = status.HTTP_200_OK
 		try:
+			serializer = PopularTagsAPISerializer(data=kwargs.get('data',{}))
 
-			# Check if the spot requested has any tag
-			user_action = get_object_or_404(UserActions,
-				spot_id=spot_id,
-				type_user_action_id=1,
-				is_active=True,
-				is_deleted=False
-			)
+			if serializer.is_valid():
 
-			# Get all the spot tag list related with the user action
-			spot_tag_list = SpotTags.objects.filter(
-				user_action_id=user_action.id,
-				is_active=True,
-				is_deleted=False
-			)
+				response_data['data'].append({
+					'tags': popular_tags(
+						serializer.validated_data['limit'],
+						serializer.validated_data.get('latitude'),
+						serializer.validated_data.get('longitude'),
+						serializer.validated_data.get('max_distance')
+					)
+				})
 
-			# Finally, get all the tags related with the spot 
-			for current_spot_tag in spot_tag_list:
+			else:
+				return Response(serializer.errors,status=status.HTTP_400_BAD_REQUEST)
 
-				tag = Tags.objects.get(id=current_spot_tag.tag_id)
+		except Exception as e:
+			logging.getLogger('error_logger').exception("[API - TagsViewSet] - Error: " + str(e))
+			code = status.HTTP_500_INTERNAL_SERVER_ERROR
+			response_data['error'].append("[API - TagsViewSet] - Error: " + str(e))
+		return Response(response_data,status=code)
 
-				if tag.name not in tag_list:
+	def list_tags(self,spot_id):
+		'''
+		Function to list all tags related with the spot requested
+		'''
+		return self.spots_tags([spot_id]).get(int(spot_id),[])
+
+	def spots_tags(self,spot_ids):
+		'''
+		Function to list the tags of a list of spots, with a single
+		join query. Returns the tag names of each spot by spot id,
+		spots without tags are left out
+		'''
+		tags = {}
 
-					tags_to_delete.append(tag.name)
+		spot_tag_list = SpotTags.alive.filter(
+			user_action__spot_id__in=spot_ids,
+			user_action__type_user_action_id=1,
+			user_action__is_active=True,
+			user_action__is_deleted=False
+		).order_by('id').values_list('user_action__spot_id','tag__name')
 
-		except Exception as e:
-			pass
+		for spot_id, tag_name in spot_tag_list:
+			tags.setdefault(spot_id,[]).append(tag_name)
 
-		return tags_to_delete
+		return tags
 
 class TypesUserActionViewSet(viewsets.ModelViewSet):
-	queryset = TypesUserAction.objects.filter(
-		is_active=True,
-		is_deleted=False
-	).order_by('id')
+	queryset = TypesUserAction.alive.order_by('id')
 	permission_classes = [
 		permissions.AllowAny
 	]
 	serializer_class = TypesUserActionSerializer
 
 class UserActionsViewSet(viewsets.ModelViewSet):
-	queryset = UserActions.objects.filter(
-		is_active=True,
-		is_deleted=False
-	).order_by('id')
+	queryset = UserActions.alive.order_by('id')
 	permission_classes = [
 		permissions.AllowAny
 	]
@@ -588,29 +897,19 @@ class UserActionsViewSet(viewsets.ModelViewSet):
 		try:
 			user_action = None
 
-			# Check if exists the user action for the spot_id requested
-			if(UserActions.objects.filter(
+			# Get the user action for the spot_id requested, if it exists
+			user_action = UserActions.alive.filter(
 				type_user_action_id=type_user_action_id,
-				spot_id=spot_id,
-				is_active=True,
-				is_deleted=False
-			).exists()):
-
-				# Get the user action
-				user_action = UserActions.objects.get(
-					type_user_action_id=type_user_action_id,
-					spot_id=spot_id,
-					is_active=True,
-					is_deleted=False
-				)
+				spot_id=spot_id
+			).first()
 
-			else:
+			if user_action is None:
 				# Generate a new spot tag user action related with the spot_id
-				user_action=UserActionsSerializer(data={"type_user_action":type_user_action_id,"spot":spot_id})
-				if user_action.is_valid():
-					user_action.save()
+				serializer=UserActionsSerializer(data={"type_user_action":type_user_action_id,"spot":spot_id})
+				if serializer.is_valid():
+					user_action = serializer.save()
 				else:
-					raise Exception(user_action.errors)
+					raise Exception(serializer.errors)
 
 			return user_action
 
@@ -620,10 +919,7 @@ class UserActionsViewSet(viewsets.ModelViewSet):
 			raise Exception("An error happened in create_user_action: " + str(e))
 
 class SpotTagsViewSet(viewsets.ModelViewSet):
-	queryset = SpotTags.objects.filter(
-		is_active=True,
-		is_deleted=False
-	).order_by('id')
+	queryset = SpotTags.alive.order_by('id')
 	permission_classes = [
 		permissions.AllowAny
 	]
@@ -635,110 +931,116 @@ class SpotTagsViewSet(viewsets.ModelViewSet):
 		for the spot_id requested
 		'''
 		try:
-			tag_list_created = []
-			user_action = None
-			spot_tag = None
+			with transaction.atomic():
 
-			# Get or create spot tag user action related with the spot
-			user_action = UserActionsViewSet().create_user_action(1,spot_id)
+				# Get or create spot tag user action related with the spot
+				user_action = UserActionsViewSet().create_user_action(1,spot_id)
 
-			# Iterate over the tag list
-			for current_tag_name in tag_list:
-				try:
-
-					# Check if the current tag already exist
-					current_tag = get_object_or_404(Tags,name=current_tag_name,is_active=True,is_deleted=False)
-
-				except Exception as e:
-
-					# Generate the new tag
-					current_tag = Tags(name=current_tag_name)
-					current_tag.save()
-
-				try:
-
-					# Check if the current spot tag already exists with the spot 
-					spot_tag = get_object_or_404(SpotTags,user_action=user_action.id,tag=current_tag.id,is_active=True,is_deleted=False)
-
-				except Exception as e:
-
-					# Generate a new spot tag
-					spot_tag = SpotTags(user_action_id=user_action.id,tag_id=current_tag.id)
-					spot_tag.save()
-
-				tag_list_created.append({
-					"spot_tag_id": spot_tag.id,
-					"tag_id": current_tag.id,
-					"name": current_tag.name
-				})
+				# Repeated names are only created once, keeping their order
+				tag_list_created = self.add_spot_tags(user_action.id,list(OrderedDict.fromkeys(tag_list)))
 
 		except Exception as e:
-			if user_action != None:
-				user_action.delete()
-			if current_tag != None:
-				current_tag.delete()
 			raise Exception("An error happened in create_spot_tags: " + str(e))
 
 		return tag_list_created
 
-	def remove_spot_tags(self,spot_id,tag_list):
+	def sync_spot_tags(self,spot_id,tag_list):
 		'''
-		This function allows to delete all the spot tag list that are
-		relate with the tag_list and the spot requested.
-		
-		Things to consider:
-		1) It does a validation if the tags inside the tag_list exists or not
-		2) The user action that are relate with the spot, won't be delete
-		3) The tags that exists, won't be delete, just the spot tags 
+		This function allows to replace the tags of the spot_id
+		requested with the tag_list. The current tags are read with a
+		single query and compared with tag_list in memory, then the
+		spot tags left out are deleted with one UPDATE and the missing
+		ones are created in bulk, all in the same transaction.
+
+		Returns the deleted spot tags and the spot tags of tag_list
 		'''
 		try:
 			tag_list_deleted = []
+			tag_list_created = []
+			tag_names = list(OrderedDict.fromkeys(tag_list))
+
+			with transaction.atomic():
+
+				current_spot_tags = SpotTags.alive.filter(
+					user_action__spot_id=spot_id,
+					user_action__type_user_action_id=1,
+					user_action__is_active=True,
+					user_action__is_deleted=False
+				).select_for_update(of=('self',)).values_list('id','tag_id','tag__name')
+
+				for spot_tag_id, tag_id, name in current_spot_tags:
+					if name not in tag_names:
+						tag_list_deleted.append({
+							"spot_tag_id": spot_tag_id,
+							"tag_id": tag_id,
+							"name": name
+						})
+
+				if tag_list_deleted:
+					SpotTags.objects.filter(
+						id__in=[spot_tag["spot_tag_id"] for spot_tag in tag_list_deleted]
+					).update(is_active=False,is_deleted=True,updated_date=timezone.now())
+
+				if tag_names:
+					user_action = UserActionsViewSet().create_user_action(1,spot_id)
+					tag_list_created = self.add_spot_tags(user_action.id,tag_names)
 
-			# Get the user action related with the spot requested
-			user_action = get_object_or_404(UserActions,
-				spot_id=spot_id,
-				type_user_action_id=1,
-				is_active=True,
-				is_deleted=False
-			)
+		except Exception as e:
+			raise Exception("An error happened in sync_spot_tags: " + str(e))
 
-	        # Iterate on each tag to check if exists or not
-			for current_tag in tag_list:
+		return tag_list_deleted, tag_list_created
 
-				try:
+	def add_spot_tags(self,user_action_id,tag_names):
+		'''
+		Relate a list of tag names with a user action, with a constant
+		number of queries: the existing tags are read by name at once,
+		the missing ones are inserted with a single bulk_create, and so
+		are the missing spot tags. Rows created at the same time by
+		another request are skipped by the unique constraints
+		(ignore_conflicts) and read back afterwards
+		'''
+		tag_list_created = []
 
-					# If exist the tag
-					tag = get_object_or_404(Tags,
-						name=current_tag,
-						is_active=True,
-						is_deleted=False
-					)
+		tags = self.alive_tags(tag_names)
+		missing_tags = [name for name in tag_names if name not in tags]
 
-					# Then, delete the current tag for the spot requested
-					spot_tag = SpotTags.objects.get(
-						user_action_id=user_action.id,
-						tag_id=tag.id,
-						is_active=True,
-						is_deleted=False
-					)
+		if missing_tags:
+			Tags.objects.bulk_create(
+				[Tags(name=name) for name in missing_tags],
+				ignore_conflicts=True)
+			tags.update(self.alive_tags(missing_tags))
 
-					spot_tag.is_active = False
-					spot_tag.is_deleted = True
-					spot_tag.save()
+		spot_tags = self.alive_spot_tags(user_action_id,tags.values())
+		missing_spot_tags = [tag for tag in tags.values() if tag.id not in spot_tags]
 
-					tag_list_deleted.append({
-						"spot_tag_id": spot_tag.id,
-						"tag_id": tag.id,
-						"name": tag.name
-					})
+		if missing_spot_tags:
+			SpotTags.objects.bulk_create(
+				[SpotTags(user_action_id=user_action_id,tag_id=tag.id) for tag in missing_spot_tags],
+				ignore_conflicts=True)
+			spot_tags.update(self.alive_spot_tags(user_action_id,missing_spot_tags))
 
-				# The tag didn't exist, so continue with the next
-				except Exception as e:
-					continue
+		for name in tag_names:
+			tag_list_created.append({
+				"spot_tag_id": spot_tags[tags[name].id],
+				"tag_id": tags[name].id,
+				"name": name
+			})
 
-		# There isn't user action related with the spot requested,
-		# so the tags requested are fake. Then, ignore them
-		except Exception as e:
-			pass
+		return tag_list_created
+
+	def alive_tags(self,tag_names):
+		'''
+		Get the active tags of a list of names, by name
+		'''
+		return {tag.name: tag for tag in Tags.alive.filter(
+			name__in=tag_names
+		)}
 
-		return tag_list_deleted
+	def alive_spot_tags(self,user_action_id,tags):
+		'''
+		Get the ids of the active spot tags of a user action, by tag id
+		'''
+		return dict(SpotTags.alive.filter(
+			user_action_id=user_action_id,
+			tag_id__in=[tag.id for tag in tags]
+		).values_list('tag_id','id'))
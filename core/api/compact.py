@@ -0,0 +1,77 @@
+import math
+import sys
+from array import array
+
+# Decimal places kept by the encoded polyline, about 1 meter
+POLYLINE_PRECISION = 5
+
+# Coordinates of the int32 buffer are microdegrees, about 11 centimeters
+MICRODEGREES = 10 ** 6
+
+def scale(value, factor):
+	'''
+	Round a coordinate to an integer number of 1/factor degrees,
+	halves away from zero as the polyline algorithm does
+	'''
+	value = float(value) * factor
+	return int(math.floor(value + 0.5)) if value >= 0 else -int(math.floor(-value + 0.5))
+
+def encode_polyline(points, precision=POLYLINE_PRECISION):
+	'''
+	Google encoded polyline of a list of (lat, lng): each coordinate
+	is rounded to precision decimals and stored as the difference with
+	the previous point, in chunks of 5 bits written as ASCII characters
+	'''
+	factor = 10 ** precision
+	output = []
+	previous_lat = previous_lng = 0
+
+	for lat, lng in points:
+		lat = scale(lat, factor)
+		lng = scale(lng, factor)
+
+		for value in (lat - previous_lat, lng - previous_lng):
+			value = ~(value << 1) if value < 0 else value << 1
+			while value >= 0x20:
+				output.append(chr((0x20 | (value & 0x1f)) + 63))
+				value >>= 5
+			output.append(chr(value + 63))
+
+		previous_lat, previous_lng = lat, lng
+
+	return ''.join(output)
+
+def pack_int32(ids, points):
+	'''
+	Little-endian buffer with the number of spots (uint32), their ids
+	(int32) and then their lat, lng pairs (int32 microdegrees)
+	'''
+	count = array('I', [len(ids)])
+	values = array('i', ids)
+	for lat, lng in points:
+		values.append(scale(lat, MICRODEGREES))
+		values.append(scale(lng, MICRODEGREES))
+
+	if sys.byteorder == 'big':
+		count.byteswap()
+		values.byteswap()
+
+	return count.tobytes() + values.tobytes()
+
+def nearby_results(data):
+	'''
+	Entries of a nearby_places response that have a nearby list, so the
+	compact renderers leave the error responses as they are
+	'''
+	if not isinstance(data, dict):
+		return []
+	return [
+		entry for entry in data.get('data', [])
+		if isinstance(entry, dict) and isinstance(entry.get('nearby'), list)
+	]
+
+def nearby_points(nearby):
+	'''
+	Spot ids and (lat, lng) points of a nearby list
+	'''
+	return [spot['id'] for spot in nearby], [(spot['lat'], spot['lng']) for spot in nearby]
@@ -0,0 +1,70 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Spots, Images, Tags, UserActions, SpotTags
+from . import spatial_index
+from .tiles import invalidate_spot_tiles
+
+def soft_delete_spots(spot_ids):
+	'''
+	Soft delete a list of spots with everything related to them: their
+	user actions, spot tags and images, and the tags that aren't used
+	by any other spot anymore.
+
+	Each table is updated with a single statement whatever the number
+	of spots, all in the same transaction. update() doesn't send
+	post_save, so the spatial index of this worker and the cached tiles
+	are refreshed once the transaction is committed (updated_date is
+	set, so the rest of the workers rebuild their index).
+
+	Returns the deleted spots, the ones that were already deleted or
+	don't exist are skipped
+	'''
+	now = timezone.now()
+
+	with transaction.atomic():
+
+		# Lock the spots, so two requests can't delete the same ones at once
+		spots = list(Spots.alive.filter(id__in=spot_ids).select_for_update()
+			.only('id','name','lat','lng','user_id').order_by('id'))
+
+		if not spots:
+			return []
+
+		ids = [spot.id for spot in spots]
+
+		Spots.objects.filter(id__in=ids).update(
+			is_active=False,is_deleted=True,updated_date=now)
+
+		spot_tags = SpotTags.alive.filter(user_action__spot_id__in=ids)
+		tag_ids = set(spot_tags.values_list('tag_id',flat=True))
+
+		# The trigger of api_spottags decreases the usage_count of the tags
+		spot_tags.update(is_active=False,is_deleted=True,updated_date=now)
+
+		UserActions.alive.filter(spot_id__in=ids).update(
+			is_active=False,is_deleted=True,updated_date=now)
+
+		Images.alive.filter(spot_id__in=ids).update(
+			is_active=False,is_deleted=True,updated_date=now)
+
+		# The tags that don't exist for any other spot
+		Tags.alive.filter(
+			id__in=tag_ids,
+			usage_count=0
+		).update(is_active=False,is_deleted=True,updated_date=now)
+
+		transaction.on_commit(lambda: spots_deleted(spots))
+
+	return spots
+
+def spots_deleted(spots):
+	'''
+	Drop deleted spots from the spatial index of this worker and from
+	the cached map tiles
+	'''
+	for spot in spots:
+		spot.is_active = False
+		spot.is_deleted = True
+		spatial_index.update_spot(spot)
+		invalidate_spot_tiles(spot)
@@ -0,0 +1,111 @@
+import json
+
+from django.contrib.gis.db.models.functions import AsGeoJSON
+from django.contrib.postgres.fields import ArrayField
+from django.db.models import FloatField, Func
+from rest_framework import serializers
+
+# Spot fields in the order of SpotsSerializer, so both paths give the
+# same payload. A field added to Spots must be added here too
+SPOT_FIELDS = (
+	'id','is_active','is_deleted','updated_date','created_date','name',
+	'country','country_code','state','city','full_address','postal_code',
+	'lat','lng','geom','position','enrichment_status','user'
+)
+
+# Only used for its formatting, it doesn't need to be bound to a serializer
+datetime_field = serializers.DateTimeField()
+
+def encode_decimal(value):
+	'''
+	Decimal as the string of DRF DecimalField, with every decimal place
+	'''
+	return None if value is None else '{:f}'.format(value)
+
+def encode_datetime(value):
+	'''
+	Datetime in the output format and timezone of DRF DateTimeField
+	'''
+	return None if value is None else datetime_field.to_representation(value)
+
+def encode_geometry(value):
+	'''
+	Geometry as the EWKT string of the serializers
+	'''
+	return None if value is None else value.ewkt
+
+def encode_geojson(value):
+	'''
+	GeoJSON geometry written by ST_AsGeoJSON, as a dict
+	'''
+	return None if value is None else json.loads(value)
+
+class PointXY(Func):
+	'''
+	[x, y] of a point geometry with ST_X/ST_Y, NULL for the rest of
+	the geometry types
+	'''
+	template = (
+		"CASE WHEN GeometryType(%(expressions)s) = 'POINT' "
+		"THEN ARRAY[ST_X(%(expressions)s), ST_Y(%(expressions)s)] END"
+	)
+	output_field = ArrayField(FloatField())
+
+def geojson_expression(field):
+	'''
+	GeoJSON of a geometry with ST_AsGeoJSON, with the digits of the
+	lat and lng columns
+	'''
+	return AsGeoJSON(field, precision=15)
+
+GEOMETRY_FIELDS = ('geom','position')
+
+# Geometry output formats, with the database expression that encodes the
+# geometry columns (None reads the column) and the encoder of its values.
+# ewkt is the format of the serializers, it builds a GEOS object for each
+# value. xy and geojson are written by PostGIS, no geometry object is
+# built in Python
+GEOMETRY_FORMATS = {
+	'ewkt': (None, encode_geometry),
+	'xy': (PointXY, None),
+	'geojson': (geojson_expression, encode_geojson),
+}
+
+SPOT_ENCODERS = {
+	'updated_date': encode_datetime,
+	'created_date': encode_datetime,
+	'lat': encode_decimal,
+	'lng': encode_decimal,
+}
+
+# Columns read for the foreign keys, without joining their table
+SPOT_COLUMNS = {
+	'user': 'user_id',
+}
+
+def spot_rows(queryset, fields=SPOT_FIELDS, geometry='ewkt'):
+	'''
+	Encode the spots of a queryset as the dicts of SpotsSerializer,
+	reading plain rows with values_list(), without building model
+	instances nor serializer fields. Each row is encoded once, ready
+	to be rendered. geometry is one of GEOMETRY_FORMATS
+	'''
+	expression, geometry_encoder = GEOMETRY_FORMATS[geometry]
+	columns = []
+	encoders = []
+
+	for field in fields:
+		if field in GEOMETRY_FIELDS:
+			columns.append(expression(field) if expression else field)
+			encoders.append(geometry_encoder)
+		else:
+			columns.append(SPOT_COLUMNS.get(field, field))
+			encoders.append(SPOT_ENCODERS.get(field))
+
+	return [
+		{
+			field: encoder(value) if encoder else value
+			for field, encoder, value in zip(fields, encoders, row)
+		}
+		for row in queryset.values_list(*columns)
+	]
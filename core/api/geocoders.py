@@ -0,0 +1,159 @@
+import logging
+import math
+import threading
+
+from django.contrib.gis.gdal import DataSource
+from django.core.exceptions import ImproperlyConfigured
+from django.contrib.gis.geos import Point
+from geopy.geocoders import Nominatim
+
+from core.settings import (geocoder_timeout,geocoder_boundaries_path)
+
+PLACE_FIELDS = ('country_name','country_code','state_name','city_name',
+	'postal_code','full_address')
+
+class BaseGeocoderBackend(object):
+	'''
+	Reverse geocoder interface. reverse() gets a coordinate and returns
+	the place_information fields listed in `fields` (or an empty dict
+	when the place wasn't found), and may raise GeocoderTimedOut
+	'''
+	fields = PLACE_FIELDS
+
+	# Remote backends are cached and their concurrent calls coalesced
+	remote = True
+
+	def reverse(self, latitude, longitude):
+		raise NotImplementedError
+
+class NominatimBackend(BaseGeocoderBackend):
+	'''
+	OpenStreetMap Nominatim through geopy
+	'''
+	def __init__(self):
+		self.geolocator = Nominatim(user_agent="My_django_google_maps_app",timeout=geocoder_timeout)
+
+	def reverse(self, latitude, longitude):
+		location = self.geolocator.reverse("{}, {}".format(latitude, longitude))
+		place_information = {}
+
+		if(location):
+			try:
+				place_information['country_name']=location.raw['address']['country']
+				place_information['country_code']=location.raw['address']['country_code'].upper()
+			except Exception as e:
+				place_information["country_name"]="undefined"
+				place_information["country_code"]="undefined"
+			try:
+				place_information['state_name']=location.raw['address']['state']
+			except Exception as e:
+				place_information["state_name"]="undefined"
+			try:
+				place_information['city_name']=location.raw['address']['city']
+			except Exception as e:
+				place_information["city_name"]="undefined"
+			try:
+				place_information['postal_code']=location.raw['address']['postcode']
+			except Exception as e:
+				place_information["postal_code"]="undefined"
+			try:
+				place_information['full_address']=location.raw['display_name']
+			except Exception as e:
+				place_information["full_address"]="undefined"
+
+		return place_information
+
+class LocalBoundariesBackend(BaseGeocoderBackend):
+	'''
+	Offline geocoder over country, state and city boundary polygons,
+	loaded from any file GDAL can read (GeoJSON, shapefile...). Every
+	feature needs a `level` attribute (country, state or city) and a
+	`name`, and countries also a `country_code`.
+
+	Polygons are kept in memory in a grid of 1 degree cells, so a lookup
+	only tests the prepared geometries whose bounding box touches the
+	cell of the point
+	'''
+	fields = ('country_name','country_code','state_name','city_name')
+	remote = False
+	levels = ('country','state','city')
+
+	def __init__(self, path=geocoder_boundaries_path):
+		self.path = path
+		self.cells = None
+		self.lock = threading.Lock()
+
+	def load(self):
+		cells = {}
+		features = 0
+
+		for layer in DataSource(self.path):
+			for feature in layer:
+				level = feature.get('level')
+				if level not in self.levels:
+					continue
+
+				geometry = feature.geom
+				if geometry.srid != 4326:
+					geometry.transform(4326)
+				geometry = geometry.geos
+
+				boundary = (
+					level,
+					geometry.prepared,
+					feature.get('name'),
+					feature.get('country_code') if level == 'country' else None
+				)
+
+				min_lng, min_lat, max_lng, max_lat = geometry.extent
+				for lat in range(int(math.floor(min_lat)), int(math.floor(max_lat)) + 1):
+					for lng in range(int(math.floor(min_lng)), int(math.floor(max_lng)) + 1):
+						cells.setdefault((lat, lng), []).append(boundary)
+				features += 1
+
+		logging.getLogger('info_logger').info(
+			"[LocalBoundariesBackend] - Loaded %s boundaries in %s cells" % (features, len(cells)))
+		return cells
+
+	def reverse(self, latitude, longitude):
+		if self.cells is None:
+			with self.lock:
+				if self.cells is None:
+					self.cells = self.load()
+
+		point = Point(float(longitude), float(latitude), srid=4326)
+		found = {}
+
+		for level, geometry, name, country_code in self.cells.get(
+				(int(math.floor(latitude)), int(math.floor(longitude))), ()):
+			if level not in found and geometry.contains(point):
+				found[level] = (name, country_code)
+
+		if not found:
+			return {}
+
+		country_code = found.get('country', (None, None))[1]
+
+		return {
+			'country_name': found.get('country', ('undefined',))[0],
+			'country_code': country_code.upper() if country_code else 'undefined',
+			'state_name': found.get('state', ('undefined',))[0],
+			'city_name': found.get('city', ('undefined',))[0]
+		}
+
+GEOCODER_BACKENDS = {
+	'nominatim': NominatimBackend,
+	'local': LocalBoundariesBackend
+}
+
+def get_backend(name):
+	'''
+	Return an instance of the backend registered with name, or None
+	for 'none'. Raises ImproperlyConfigured for an unknown name
+	'''
+	if not name or name == 'none':
+		return None
+	if name not in GEOCODER_BACKENDS:
+		raise ImproperlyConfigured('Unknown geocoder backend "%s", use one of: %s' % (
+			name, ', '.join(GEOCODER_BACKENDS)))
+	return GEOCODER_BACKENDS[name]()
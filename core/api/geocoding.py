@@ -0,0 +1,257 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, connection
+from django.utils import timezone
+from geopy.exc import GeocoderTimedOut
+
+from .geocoders import PLACE_FIELDS, GEOCODER_BACKENDS, get_backend
+from .models import ReverseGeocodeCache
+from core.settings import (geocoder_cache_precision,geocoder_cache_ttl,
+	geocoder_cache_negative_ttl,geocoder_lru_size,
+	geocoder_wait_budget,geocoder_backend,geocoder_full_address_backend)
+
+# The configured backend answers every field, unless it's a local one:
+# then it's a first pass for the administrative fields and the remote
+# backend, if any, is only used for the rest (full_address, postal_code)
+geocoder = get_backend(geocoder_backend)
+if geocoder is None:
+	raise ImproperlyConfigured('geocoderConf backend is required, use one of: %s' % (
+		', '.join(GEOCODER_BACKENDS)))
+if geocoder.remote:
+	local_geocoder, remote_geocoder = None, geocoder
+else:
+	local_geocoder, remote_geocoder = geocoder, get_backend(geocoder_full_address_backend)
+
+class LRUCache(object):
+	'''
+	Thread safe least recently used cache, where every entry has
+	its own expiration time
+	'''
+	def __init__(self, size):
+		self.size = size
+		self.entries = OrderedDict()
+		self.lock = threading.Lock()
+
+	def get(self, key):
+		with self.lock:
+			entry = self.entries.get(key)
+			if entry is None:
+				return None
+			value, expires_at = entry
+			if expires_at < time.time():
+				del self.entries[key]
+				return None
+			self.entries.move_to_end(key)
+			return value
+
+	def set(self, key, value, ttl):
+		with self.lock:
+			self.entries[key] = (value, time.time() + ttl)
+			self.entries.move_to_end(key)
+			while len(self.entries) > self.size:
+				self.entries.popitem(last=False)
+
+lru_cache = LRUCache(geocoder_lru_size)
+
+counters = {'lru_hits': 0, 'db_hits': 0, 'misses': 0, 'timeouts': 0,
+	'coalesced': 0, 'wait_timeouts': 0}
+counters_lock = threading.Lock()
+
+def count(counter):
+	with counters_lock:
+		counters[counter] += 1
+
+def cache_stats():
+	'''
+	Hit and miss counters of the reverse geocoding cache of this worker
+	'''
+	with counters_lock:
+		return dict(counters)
+
+def quantize(latitude, longitude):
+	'''
+	Round a coordinate to the cell of the cache that contains it
+	'''
+	step = Decimal(1).scaleb(-geocoder_cache_precision)
+	return (
+		Decimal(str(latitude)).quantize(step, rounding=ROUND_HALF_UP),
+		Decimal(str(longitude)).quantize(step, rounding=ROUND_HALF_UP)
+	)
+
+def not_found_information(fields=PLACE_FIELDS):
+	return {field: "undefined. Not found information" for field in fields}
+
+class InFlight(object):
+	'''
+	Geocoder call of a cell that is running in this process
+	'''
+	def __init__(self):
+		self.event = threading.Event()
+		self.place_information = None
+
+inflight = {}
+inflight_lock = threading.Lock()
+
+def cached_place(key, cell_lat, cell_lng):
+	'''
+	Look up a cell in the LRU cache and then in the ReverseGeocodeCache
+	table. Return None if it isn't cached or it expired
+	'''
+	place_information = lru_cache.get(key)
+	if place_information is not None:
+		count('lru_hits')
+		return place_information
+
+	entry = ReverseGeocodeCache.objects.filter(
+		precision=geocoder_cache_precision,
+		cell_lat=cell_lat,
+		cell_lng=cell_lng,
+		expires_at__gt=timezone.now()
+	).values_list('place_information','expires_at').first()
+
+	if entry is not None:
+		count('db_hits')
+		place_information, expires_at = entry
+		lru_cache.set(key, place_information, (expires_at - timezone.now()).total_seconds())
+		return place_information
+
+	return None
+
+# Session advisory locks of the cells being geocoded, shared by every
+# process using the database. The first key keeps them apart from other
+# advisory locks, the second one is the hash of the cell
+GEOCODE_LOCK_NAMESPACE = 6208
+LOCK_CELL_SQL = 'SELECT pg_try_advisory_lock(%s, hashtext(%s))'
+UNLOCK_CELL_SQL = 'SELECT pg_advisory_unlock(%s, hashtext(%s))'
+
+def lock_cell(lock_key):
+	'''
+	Take the lock of a cell without waiting, return False if another
+	process holds it
+	'''
+	with connection.cursor() as cursor:
+		cursor.execute(LOCK_CELL_SQL, [GEOCODE_LOCK_NAMESPACE, lock_key])
+		return cursor.fetchone()[0]
+
+def unlock_cell(lock_key):
+	with connection.cursor() as cursor:
+		cursor.execute(UNLOCK_CELL_SQL, [GEOCODE_LOCK_NAMESPACE, lock_key])
+
+def geocode_cell(key, cell_lat, cell_lng):
+	'''
+	Request a cell to the geocoder and cache the answer. Only one process
+	at a time does it for the same cell, holding a PostgreSQL advisory
+	lock; the rest wait for the answer to be stored in the table
+	'''
+	lock_key = 'reverse_geocode_lock:{}:{}:{}'.format(*key)
+
+	if not lock_cell(lock_key):
+		count('coalesced')
+		deadline = time.time() + geocoder_wait_budget
+		while time.time() < deadline:
+			time.sleep(0.1)
+			place_information = cached_place(key, cell_lat, cell_lng)
+			if place_information is not None:
+				return place_information
+		count('wait_timeouts')
+		return not_found_information()
+
+	try:
+		count('misses')
+		try:
+			place_information = remote_geocoder.reverse(cell_lat, cell_lng)
+		except (GeocoderTimedOut) as e:
+			# Timeouts aren't cached, the next request will try again
+			count('timeouts')
+			return not_found_information()
+
+		ttl = geocoder_cache_ttl if place_information else geocoder_cache_negative_ttl
+
+		try:
+			ReverseGeocodeCache.objects.update_or_create(
+				precision=geocoder_cache_precision,
+				cell_lat=cell_lat,
+				cell_lng=cell_lng,
+				defaults={
+					'place_information': place_information,
+					'expires_at': timezone.now() + timedelta(seconds=ttl)
+				}
+			)
+		except IntegrityError as e:
+			# Another worker stored the same cell at the same time
+			pass
+		lru_cache.set(key, place_information, ttl)
+
+		return place_information
+
+	finally:
+		unlock_cell(lock_key)
+
+def remote_place(latitude, longitude):
+	'''
+	Get the place_information of a coordinate from the remote backend.
+	Coordinates are rounded to cells of geocoder_cache_precision decimals,
+	that are looked up in an in-process LRU cache, then in the
+	ReverseGeocodeCache table, and only then requested to the geocoder.
+
+	Concurrent requests of the same cell share a single geocoder call.
+	Followers wait up to geocoder_wait_budget seconds for it, and then
+	get "undefined" fields instead
+	'''
+	cell_lat, cell_lng = quantize(latitude, longitude)
+	key = (geocoder_cache_precision, cell_lat, cell_lng)
+
+	place_information = cached_place(key, cell_lat, cell_lng)
+	if place_information is not None:
+		return place_information
+
+	with inflight_lock:
+		call = inflight.get(key)
+		leader = call is None
+		if leader:
+			call = inflight[key] = InFlight()
+
+	if not leader:
+		count('coalesced')
+		if call.event.wait(geocoder_wait_budget) and call.place_information is not None:
+			return call.place_information
+		count('wait_timeouts')
+		return not_found_information()
+
+	try:
+		call.place_information = geocode_cell(key, cell_lat, cell_lng)
+	finally:
+		with inflight_lock:
+			del inflight[key]
+		call.event.set()
+
+	return call.place_information
+
+def reverse_geocode(latitude, longitude):
+	'''
+	Get the place_information of a coordinate, from the local backend
+	first when it's configured, and then from the remote one
+	'''
+	if local_geocoder is None:
+		return remote_place(latitude, longitude)
+
+	place_information = local_geocoder.reverse(latitude, longitude)
+	for field in local_geocoder.fields:
+		place_information.setdefault(field, "undefined")
+
+	remote_fields = [field for field in PLACE_FIELDS if field not in local_geocoder.fields]
+
+	if remote_geocoder is None:
+		remote_information = {}
+	else:
+		remote_information = remote_place(latitude, longitude)
+
+	for field in remote_fields:
+		place_information[field] = remote_information.get(field, "undefined")
+
+	return place_information
@@ -0,0 +1,140 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from api.models import Spots, UserActions, SpotTags, Images, Tags
+
+# Children first: a row is only archived when no row references it
+# anymore, so the foreign keys of the hot tables are never broken.
+# Each model is listed with the (model, column) of the rows that
+# reference it
+ARCHIVED_MODELS = (
+    (SpotTags, ()),
+    (Images, ()),
+    (UserActions, ((SpotTags, 'user_action_id'),)),
+    (Spots, ((UserActions, 'spot_id'), (Images, 'spot_id'))),
+    (Tags, ((SpotTags, 'tag_id'),)),
+)
+
+# Rows that can be archived, shared by the archive and the dry run
+ARCHIVABLE_SQL = 'is_deleted AND updated_date < %(before)s {orphan}'
+
+# Move a batch of rows in a single statement. SKIP LOCKED leaves out the
+# rows locked by a request instead of waiting for them
+ARCHIVE_SQL = '''
+    WITH moved AS (
+        DELETE FROM {table}
+        WHERE id IN (
+            SELECT id
+            FROM {table}
+            WHERE {archivable}
+                AND id > %(after)s
+            ORDER BY id
+            LIMIT %(batch_size)s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING {columns}
+    ), archived AS (
+        INSERT INTO {table}_archive ({columns})
+        SELECT {columns} FROM moved
+        RETURNING id
+    )
+    SELECT count(*), max(id) FROM archived
+'''
+
+COUNT_SQL = '''
+    SELECT count(*)
+    FROM {table}
+    WHERE {archivable}
+'''
+
+ORPHAN_SQL = '''
+    AND NOT EXISTS (
+        SELECT 1 FROM {child_table} WHERE {child_table}.{column} = {table}.id
+    )
+'''
+
+class Command(BaseCommand):
+    help = 'Move the rows soft deleted more than some days ago to the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30,
+            help='Archive the rows soft deleted more than these days ago')
+        parser.add_argument('--batch-size', type=int, default=1000,
+            help='Number of rows moved by each statement')
+        parser.add_argument('--sleep', type=float, default=0.5,
+            help='Seconds to wait between batches, to throttle the load')
+        parser.add_argument('--dry-run', action='store_true',
+            help='Only report the number of rows that would be archived')
+
+    def archivable_sql(self, model, children):
+        '''
+        WHERE clause of the rows of model that can be archived
+        '''
+        table = model._meta.db_table
+        orphan = ''.join(
+            ORPHAN_SQL.format(child_table=child._meta.db_table, column=column, table=table)
+            for child, column in children)
+
+        return ARCHIVABLE_SQL.format(orphan=orphan)
+
+    def archive_sql(self, model, children):
+        columns = ', '.join(
+            connection.ops.quote_name(field.column) for field in model._meta.concrete_fields)
+
+        return ARCHIVE_SQL.format(table=model._meta.db_table, columns=columns,
+            archivable=self.archivable_sql(model, children))
+
+    def handle(self, *args, **options):
+        try:
+            before = timezone.now() - timedelta(days=options['days'])
+
+            if options['dry_run']:
+                # Same condition as the archive, over the rows referencing
+                # each table now: the parents only referenced by children
+                # archived earlier in the same run aren't counted
+                with connection.cursor() as cursor:
+                    for model, children in ARCHIVED_MODELS:
+                        cursor.execute(COUNT_SQL.format(table=model._meta.db_table,
+                            archivable=self.archivable_sql(model, children)), {'before': before})
+                        self.stdout.write('%s: %s rows soft deleted before %s would be archived' % (
+                            model._meta.db_table, cursor.fetchone()[0], before))
+                return
+
+            for model, children in ARCHIVED_MODELS:
+                sql = self.archive_sql(model, children)
+                archived = 0
+                last_id = 0
+
+                # Walk the primary key in batches. Each batch is committed on
+                # its own, so the locks are short and the command can be
+                # stopped and run again at any time
+                while True:
+                    with transaction.atomic(), connection.cursor() as cursor:
+                        cursor.execute(sql, {
+                            'before': before,
+                            'after': last_id,
+                            'batch_size': options['batch_size']
+                        })
+                        moved, max_id = cursor.fetchone()
+
+                    if not moved:
+                        break
+
+                    archived += moved
+                    last_id = max_id
+
+                    if moved < options['batch_size']:
+                        break
+
+                    time.sleep(options['sleep'])
+
+                self.stdout.write('%s: %s rows archived' % (model._meta.db_table, archived))
+
+            self.stdout.write(self.style.SUCCESS('Successfully archived the soft deleted rows'))
+
+        except Exception as e:
+            self.stdout.write(self.style.ERROR('An error happened: "%s"' % str(e)))
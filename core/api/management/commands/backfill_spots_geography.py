@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Max, Min
+
+from api.models import Spots
+
+class Command(BaseCommand):
+    help = 'Fill in the position_geog column of the spots created before it existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000,
+            help='Number of ids updated by each statement')
+        parser.add_argument('--sleep', type=float, default=0.1,
+            help='Seconds to wait between batches, to throttle the load')
+
+    def handle(self, *args, **options):
+        try:
+            bounds = Spots.objects.aggregate(first=Min('id'), last=Max('id'))
+            updated = 0
+
+            if bounds['first'] is not None:
+
+                # Walk the primary key in ranges. Each UPDATE is committed on
+                # its own, so only the rows of the current batch are locked
+                # and the command can be stopped and run again at any time
+                for start in range(bounds['first'] - 1, bounds['last'], options['batch_size']):
+                    with connection.cursor() as cursor:
+                        cursor.execute('''
+                            UPDATE api_spots
+                            SET position_geog = position::geography
+                            WHERE id > %s AND id <= %s
+                                AND position IS NOT NULL
+                                AND position_geog IS NULL
+                        ''', [start, start + options['batch_size']])
+                        updated += cursor.rowcount
+
+                    time.sleep(options['sleep'])
+
+            self.stdout.write(self.style.SUCCESS('Successfully backfilled %s spots' % updated))
+
+        except Exception as e:
+            self.stdout.write(self.style.ERROR('An error happened: "%s"' % str(e)))
@@ -0,0 +1,85 @@
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.gis.geos import Point
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.encoders import GEOMETRY_FORMATS, spot_rows
+from api.models import Spots
+from api.renderers import FastJSONRenderer
+from api.serializers import SpotsSerializer
+
+class Command(BaseCommand):
+    help = 'Compare the time to encode spots with SpotsSerializer and with each geometry format of spot_rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000,
+            help='Number of spots encoded by each run')
+        parser.add_argument('--repeat', type=int, default=5,
+            help='Runs of each encoder, the best one is reported')
+        parser.add_argument('--create', action='store_true',
+            help='Insert the spots for the benchmark, they are rolled back at the end')
+
+    def create_spots(self, rows):
+        user = get_user_model().objects.order_by('id').first()
+        if user is None:
+            raise Exception('There are no users, run fixtures_insert first')
+        spots = []
+        for i in range(rows):
+            lat = Decimal('%.16f' % random.uniform(-85, 85))
+            lng = Decimal('%.16f' % random.uniform(-180, 180))
+            point = Point(float(lng), float(lat), srid=4326)
+            spots.append(Spots(name='Benchmark spot %s' % i, lat=lat, lng=lng,
+                geom=point, position=point, user=user))
+        Spots.objects.bulk_create(spots, batch_size=1000)
+
+    def measure(self, encode, repeat):
+        '''
+        Best time of encode, and of rendering its result to JSON,
+        in milliseconds
+        '''
+        renderer = FastJSONRenderer()
+        best_encode = best_render = None
+        for i in range(repeat):
+            start = time.perf_counter()
+            data = encode()
+            encoded = time.perf_counter()
+            renderer.render(data)
+            rendered = time.perf_counter()
+
+            encode_time = (encoded - start) * 1000
+            render_time = (rendered - encoded) * 1000
+            best_encode = encode_time if best_encode is None else min(best_encode, encode_time)
+            best_render = render_time if best_render is None else min(best_render, render_time)
+        return best_encode, best_render
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                if options['create']:
+                    self.create_spots(options['rows'])
+
+                queryset = Spots.alive.order_by('-id')[:options['rows']]
+                rows = queryset.count()
+
+                encoders = [('SpotsSerializer', lambda: SpotsSerializer(queryset, many=True).data)]
+                for geometry in GEOMETRY_FORMATS:
+                    encoders.append(('spot_rows geometry=%s' % geometry,
+                        lambda geometry=geometry: spot_rows(queryset, geometry=geometry)))
+
+                self.stdout.write('%s spots, best of %s runs (query + encode / render)' % (
+                    rows, options['repeat']))
+                for name, encode in encoders:
+                    encode_time, render_time = self.measure(encode, options['repeat'])
+                    self.stdout.write('%-28s %9.1f ms / %7.1f ms' % (name, encode_time, render_time))
+
+                # The benchmark spots are never committed
+                transaction.set_rollback(True)
+
+            self.stdout.write(self.style.SUCCESS('Successfully ran the benchmark'))
+
+        except Exception as e:
+            self.stdout.write(self.style.ERROR('An error happened: "%s"' % str(e)))
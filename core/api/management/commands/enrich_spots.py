@@ -0,0 +1,103 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.geocoding import reverse_geocode, cache_stats
+from api.models import (Spots,ENRICHMENT_PENDING,ENRICHMENT_DONE,
+    ENRICHMENT_FAILED)
+
+# Spots columns filled from each place_information field
+ADDRESS_FIELDS = (
+    ('country', 'country_name'),
+    ('country_code', 'country_code'),
+    ('state', 'state_name'),
+    ('city', 'city_name'),
+    ('postal_code', 'postal_code'),
+    ('full_address', 'full_address'),
+)
+
+NOT_FOUND = 'undefined. Not found information'
+
+class Command(BaseCommand):
+    help = 'Fill in the address fields of the spots created with defer_enrichment'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+            help='Number of pending spots read by each query')
+        parser.add_argument('--rate', type=float, default=1.0,
+            help='Seconds to wait after each request sent to the geocoder. '
+                'Nominatim allows one request per second')
+        parser.add_argument('--loop', action='store_true',
+            help='Keep waiting for new pending spots instead of exiting')
+        parser.add_argument('--idle-sleep', type=float, default=10,
+            help='Seconds to wait when there are no pending spots, with --loop')
+
+    def enrich(self, spot):
+        '''
+        Geocode a spot and store its address. Returns the new
+        enrichment_status, or None when the geocoder didn't answer
+        and the spot must be tried again
+        '''
+        place_information = reverse_geocode(spot.lat, spot.lng)
+
+        if NOT_FOUND in place_information.values():
+            return None
+
+        values = {}
+        for column, field in ADDRESS_FIELDS:
+            value = place_information.get(field) or ''
+            if value.startswith('undefined'):
+                value = ''
+            # Address fields sent with the spot are kept
+            if value and not getattr(spot, column):
+                values[column] = value[:Spots._meta.get_field(column).max_length]
+
+        if values or any(getattr(spot, column) for column, field in ADDRESS_FIELDS):
+            values['enrichment_status'] = ENRICHMENT_DONE
+        else:
+            values['enrichment_status'] = ENRICHMENT_FAILED
+
+        # update() so the post_save signal isn't sent, positions don't change
+        Spots.objects.filter(id=spot.id).update(updated_date=timezone.now(), **values)
+
+        return values['enrichment_status']
+
+    def handle(self, *args, **options):
+        try:
+            results = {ENRICHMENT_DONE: 0, ENRICHMENT_FAILED: 0, None: 0}
+            last_id = 0
+
+            while True:
+                # Walk the pending spots by id, over their partial index.
+                # Spots left pending by a timeout are retried on the next pass
+                spots = list(Spots.objects.filter(
+                    enrichment_status=ENRICHMENT_PENDING,
+                    is_deleted=False,
+                    id__gt=last_id
+                ).order_by('id')[:options['batch_size']])
+
+                if not spots:
+                    if not options['loop']:
+                        break
+                    if last_id == 0:
+                        time.sleep(options['idle_sleep'])
+                    last_id = 0
+                    continue
+
+                for spot in spots:
+                    misses = cache_stats()['misses']
+                    results[self.enrich(spot)] += 1
+                    last_id = spot.id
+
+                    # Only the requests that reached the geocoder are throttled,
+                    # cached cells are answered right away
+                    if cache_stats()['misses'] > misses:
+                        time.sleep(options['rate'])
+
+            self.stdout.write(self.style.SUCCESS(
+                'Successfully enriched %s spots, %s not found, %s left pending' % (
+                    results[ENRICHMENT_DONE], results[ENRICHMENT_FAILED], results[None])))
+
+        except Exception as e:
+            self.stdout.write(self.style.ERROR('An error happened: "%s"' % str(e)))
@@ -0,0 +1,39 @@
+# Generated by Django 3.0.7 on 2026-10-17 10:12
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_auto_20200813_1859'),
+    ]
+
+    operations = [
+        # Nullable column without default, so adding it doesn't rewrite the table.
+        # Existing rows are filled in by the next migration, in batches
+        migrations.AddField(
+            model_name='spots',
+            name='position_geog',
+            field=django.contrib.gis.db.models.fields.PointField(blank=True, geography=True, null=True, spatial_index=False, srid=4326),
+        ),
+        migrations.RunSQL(
+            sql='''
+                CREATE FUNCTION api_spots_sync_position_geog() RETURNS trigger AS $$
+                BEGIN
+                    NEW.position_geog := NEW.position::geography;
+                    RETURN NEW;
+                END;
+                $$ LANGUAGE plpgsql;
+
+                CREATE TRIGGER api_spots_sync_position_geog
+                    BEFORE INSERT OR UPDATE OF position ON api_spots
+                    FOR EACH ROW EXECUTE PROCEDURE api_spots_sync_position_geog();
+            ''',
+            reverse_sql='''
+                DROP TRIGGER IF EXISTS api_spots_sync_position_geog ON api_spots;
+                DROP FUNCTION IF EXISTS api_spots_sync_position_geog();
+            ''',
+        ),
+    ]
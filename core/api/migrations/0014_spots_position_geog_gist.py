@@ -0,0 +1,48 @@
+# Generated by Django 3.0.7 on 2026-10-17 10:12
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+BATCH_SIZE = 5000
+
+
+def backfill_position_geog(apps, schema_editor):
+    # Same batches as the backfill_spots_geography command: the primary key
+    # is walked in ranges and each UPDATE is committed on its own, so only
+    # the rows of the current batch are locked. Every spot has its
+    # position_geog before the searches start reading it
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT min(id), max(id) FROM api_spots')
+        first, last = cursor.fetchone()
+
+        if first is None:
+            return
+
+        for start in range(first - 1, last, BATCH_SIZE):
+            cursor.execute('''
+                UPDATE api_spots
+                SET position_geog = position::geography
+                WHERE id > %s AND id <= %s
+                    AND position IS NOT NULL
+                    AND position_geog IS NULL
+            ''', [start, start + BATCH_SIZE])
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('api', '0013_spots_position_geog'),
+    ]
+
+    operations = [
+        # Filled in before the index is built, so it's built once
+        migrations.RunPython(backfill_position_geog, migrations.RunPython.noop, atomic=False),
+        AddIndexConcurrently(
+            model_name='spots',
+            index=django.contrib.postgres.indexes.GistIndex(fields=['position_geog'], name='api_spots_position_geog_gist'),
+        ),
+    ]
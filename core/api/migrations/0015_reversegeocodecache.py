@@ -0,0 +1,30 @@
+# Generated by Django 3.0.7 on 2026-10-17 21:48
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_spots_position_geog_gist'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReverseGeocodeCache',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('precision', models.PositiveSmallIntegerField()),
+                ('cell_lat', models.DecimalField(decimal_places=6, max_digits=10)),
+                ('cell_lng', models.DecimalField(decimal_places=6, max_digits=10)),
+                ('place_information', django.contrib.postgres.fields.jsonb.JSONField()),
+                ('expires_at', models.DateTimeField()),
+                ('updated_date', models.DateTimeField(auto_now=True)),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('precision', 'cell_lat', 'cell_lng')},
+            },
+        ),
+    ]
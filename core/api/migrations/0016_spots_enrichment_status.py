@@ -0,0 +1,18 @@
+# Generated by Django 3.0.7 on 2026-10-17 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_reversegeocodecache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='spots',
+            name='enrichment_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('done', 'Done'), ('failed', 'Failed')], default='done', max_length=10),
+        ),
+    ]
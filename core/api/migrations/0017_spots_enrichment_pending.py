@@ -0,0 +1,21 @@
+# Generated by Django 3.0.7 on 2026-10-17 11:40
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('api', '0016_spots_enrichment_status'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='spots',
+            index=models.Index(condition=models.Q(enrichment_status='pending'), fields=['id'], name='api_spots_enrichment_pending'),
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 3.0.7 on 2026-10-17 13:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('api', '0017_spots_enrichment_pending'),
+    ]
+
+    operations = [
+        # Merge the live duplicates created by concurrent requests before
+        # adding the constraints: the spot tags of a duplicated tag are moved
+        # to its oldest copy, and the rest of the duplicates are soft deleted.
+        # The statements are sent together, so they run in one transaction
+        migrations.RunSQL(
+            sql='''
+                UPDATE api_spottags
+                SET tag_id = duplicates.keep_id
+                FROM (
+                    SELECT id, min(id) OVER (PARTITION BY name) AS keep_id
+                    FROM api_tags
+                    WHERE is_active AND NOT is_deleted
+                ) duplicates
+                WHERE api_spottags.tag_id = duplicates.id
+                    AND duplicates.id <> duplicates.keep_id;
+
+                UPDATE api_tags
+                SET is_active = false, is_deleted = true, updated_date = now()
+                FROM (
+                    SELECT id, min(id) OVER (PARTITION BY name) AS keep_id
+                    FROM api_tags
+                    WHERE is_active AND NOT is_deleted
+                ) duplicates
+                WHERE api_tags.id = duplicates.id
+                    AND duplicates.id <> duplicates.keep_id;
+
+                UPDATE api_spottags
+                SET is_active = false, is_deleted = true, updated_date = now()
+                FROM (
+                    SELECT id, min(id) OVER (PARTITION BY user_action_id, tag_id) AS keep_id
+                    FROM api_spottags
+                    WHERE is_active AND NOT is_deleted
+                ) duplicates
+                WHERE api_spottags.id = duplicates.id
+                    AND duplicates.id <> duplicates.keep_id;
+            ''',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        # The unique indexes are built without blocking the writes. If a
+        # duplicate is created meanwhile the build fails, and running the
+        # migration again merges it and drops the invalid index first
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    sql=[
+                        'DROP INDEX CONCURRENTLY IF EXISTS api_spottags_user_action_tag_alive_uniq;',
+                        '''
+                            CREATE UNIQUE INDEX CONCURRENTLY api_spottags_user_action_tag_alive_uniq
+                            ON api_spottags (user_action_id, tag_id)
+                            WHERE is_active AND NOT is_deleted;
+                        ''',
+                        'DROP INDEX CONCURRENTLY IF EXISTS api_tags_name_alive_uniq;',
+                        '''
+                            CREATE UNIQUE INDEX CONCURRENTLY api_tags_name_alive_uniq
+                            ON api_tags (name)
+                            WHERE is_active AND NOT is_deleted;
+                        ''',
+                    ],
+                    reverse_sql=[
+                        'DROP INDEX CONCURRENTLY IF EXISTS api_spottags_user_action_tag_alive_uniq;',
+                        'DROP INDEX CONCURRENTLY IF EXISTS api_tags_name_alive_uniq;',
+                    ],
+                ),
+            ],
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='spottags',
+                    constraint=models.UniqueConstraint(condition=models.Q(('is_active', True), ('is_deleted', False)), fields=('user_action', 'tag'), name='api_spottags_user_action_tag_alive_uniq'),
+                ),
+                migrations.AddConstraint(
+                    model_name='tags',
+                    constraint=models.UniqueConstraint(condition=models.Q(('is_active', True), ('is_deleted', False)), fields=('name',), name='api_tags_name_alive_uniq'),
+                ),
+            ],
+        ),
+    ]
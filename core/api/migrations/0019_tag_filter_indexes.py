@@ -0,0 +1,25 @@
+# Generated by Django 3.0.7 on 2026-10-17 14:02
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('api', '0018_unique_alive_tags'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='spottags',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_deleted', False)), fields=['tag', 'user_action'], name='api_spottags_tag_alive'),
+        ),
+        AddIndexConcurrently(
+            model_name='useractions',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_deleted', False)), fields=['spot', 'type_user_action'], name='api_useractions_spot_alive'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.0.7 on 2026-10-17 15:31
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('api', '0019_tag_filter_indexes'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        AddIndexConcurrently(
+            model_name='tags',
+            index=django.contrib.postgres.indexes.GinIndex(condition=models.Q(('is_active', True), ('is_deleted', False)), fields=['name'], name='api_tags_name_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 3.0.7 on 2026-10-17 16:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_tags_name_trgm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tags',
+            name='usage_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        # The counter changes in the same transaction as the spot tag, for
+        # every write path (save, update, bulk_create or raw SQL). The trigger
+        # is created before counting, and it locks api_spottags for writes
+        # until the migration commits, so no change is lost in between
+        migrations.RunSQL(
+            sql='''
+                CREATE FUNCTION api_spottags_usage_count() RETURNS trigger AS $$
+                BEGIN
+                    IF TG_OP = 'UPDATE' THEN
+                        IF OLD.tag_id = NEW.tag_id
+                            AND (OLD.is_active AND NOT OLD.is_deleted) = (NEW.is_active AND NOT NEW.is_deleted) THEN
+                            RETURN NULL;
+                        END IF;
+                    END IF;
+
+                    IF TG_OP <> 'INSERT' THEN
+                        IF OLD.is_active AND NOT OLD.is_deleted THEN
+                            UPDATE api_tags SET usage_count = usage_count - 1 WHERE id = OLD.tag_id;
+                        END IF;
+                    END IF;
+
+                    IF TG_OP <> 'DELETE' THEN
+                        IF NEW.is_active AND NOT NEW.is_deleted THEN
+                            UPDATE api_tags SET usage_count = usage_count + 1 WHERE id = NEW.tag_id;
+                        END IF;
+                    END IF;
+
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql;
+
+                CREATE TRIGGER api_spottags_usage_count
+                    AFTER INSERT OR UPDATE OF tag_id, is_active, is_deleted OR DELETE ON api_spottags
+                    FOR EACH ROW EXECUTE PROCEDURE api_spottags_usage_count();
+
+                UPDATE api_tags
+                SET usage_count = counts.usage_count
+                FROM (
+                    SELECT tag_id, count(*) AS usage_count
+                    FROM api_spottags
+                    WHERE is_active AND NOT is_deleted
+                    GROUP BY tag_id
+                ) counts
+                WHERE api_tags.id = counts.tag_id;
+            ''',
+            reverse_sql='''
+                DROP TRIGGER IF EXISTS api_spottags_usage_count ON api_spottags;
+                DROP FUNCTION IF EXISTS api_spottags_usage_count();
+            ''',
+        ),
+    ]
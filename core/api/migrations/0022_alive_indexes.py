@@ -0,0 +1,25 @@
+# Generated by Django 3.0.7 on 2026-10-17 17:26
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('api', '0021_tags_usage_count'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='images',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_deleted', False)), fields=['spot'], name='api_images_spot_alive'),
+        ),
+        AddIndexConcurrently(
+            model_name='spots',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_deleted', False)), fields=['user', '-id'], name='api_spots_user_alive'),
+        ),
+    ]
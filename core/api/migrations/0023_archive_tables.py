@@ -0,0 +1,35 @@
+# Generated by Django 3.0.7 on 2026-10-17 18:40
+
+from django.db import migrations
+
+ARCHIVED_TABLES = ('api_spots', 'api_useractions', 'api_spottags', 'api_images', 'api_tags')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_alive_indexes'),
+    ]
+
+    # Archive copies of the soft deleted tables, filled in by the
+    # archive_soft_deleted command. They have the same columns, without
+    # the indexes, constraints and defaults of the original tables, plus
+    # the date each row was archived. A column added to one of these
+    # tables must be added to its archive table too
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                '''
+                    CREATE TABLE {table}_archive (LIKE {table});
+                    ALTER TABLE {table}_archive
+                        ADD COLUMN archived_date timestamp with time zone NOT NULL DEFAULT now(),
+                        ADD PRIMARY KEY (id);
+                '''.format(table=table)
+                for table in ARCHIVED_TABLES
+            ],
+            reverse_sql=[
+                'DROP TABLE IF EXISTS {table}_archive;'.format(table=table)
+                for table in ARCHIVED_TABLES
+            ],
+        ),
+    ]
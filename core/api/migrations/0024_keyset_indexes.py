@@ -0,0 +1,29 @@
+# Generated by Django 3.0.7 on 2026-10-17 19:12
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('api', '0023_archive_tables'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='images',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_deleted', False)), fields=['-id'], name='api_images_id_alive'),
+        ),
+        AddIndexConcurrently(
+            model_name='spots',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_deleted', False)), fields=['-id'], name='api_spots_id_alive'),
+        ),
+        AddIndexConcurrently(
+            model_name='tags',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_deleted', False)), fields=['-id'], name='api_tags_id_alive'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.0.7 on 2026-10-17 19:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('api', '0024_keyset_indexes'),
+    ]
+
+    # Prefix matches of the tag autocomplete, case insensitive, with the
+    # usage_count of each tag to rank them. Index expressions aren't
+    # supported by models.Index in this Django version
+    operations = [
+        migrations.RunSQL(
+            sql='''
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS api_tags_name_prefix_alive
+                ON api_tags (lower(name) text_pattern_ops, usage_count DESC)
+                WHERE is_active AND NOT is_deleted;
+            ''',
+            reverse_sql='DROP INDEX CONCURRENTLY IF EXISTS api_tags_name_prefix_alive;',
+        ),
+    ]
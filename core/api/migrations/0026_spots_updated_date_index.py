@@ -0,0 +1,21 @@
+# Generated by Django 3.0.7 on 2026-10-17 19:28
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('api', '0025_tags_name_prefix_index'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='spots',
+            index=models.Index(fields=['updated_date'], name='api_spots_updated_date'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.0.7 on 2026-10-17 19:36
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('api', '0026_spots_updated_date_index'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='tags',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_deleted', False)), fields=['-usage_count', 'name'], name='api_tags_usage_count_alive'),
+        ),
+    ]
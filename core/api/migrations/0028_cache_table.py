@@ -0,0 +1,21 @@
+# Generated by Django 3.0.7 on 2026-10-17 19:44
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_table(apps, schema_editor):
+    # Only creates the table of the database cache, when it's configured
+    # and the table doesn't exist yet
+    call_command('createcachetable', database=schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0027_tags_usage_count_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
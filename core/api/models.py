@@ -4,6 +4,8 @@ from django.contrib.auth.models import User
 from django.contrib.auth import get_user_model
 
 from django.contrib.gis.db import models
+from django.contrib.postgres.fields import JSONField
+from django.contrib.postgres.indexes import GinIndex, GistIndex
 from django.contrib.postgres.operations import CreateExtension
 from django.db import migrations
 
@@ -16,7 +18,44 @@ class Migration(migrations.Migration):
     ]
 
 # Create your models here.
-class Spots(models.Model):
+ENRICHMENT_PENDING = 'pending'
+ENRICHMENT_DONE = 'done'
+ENRICHMENT_FAILED = 'failed'
+
+ENRICHMENT_STATUS_CHOICES = (
+	(ENRICHMENT_PENDING, 'Pending'),
+	(ENRICHMENT_DONE, 'Done'),
+	(ENRICHMENT_FAILED, 'Failed'),
+)
+
+# Rows that weren't soft deleted
+ALIVE = models.Q(is_active=True, is_deleted=False)
+
+class AliveManager(models.Manager):
+	'''
+	Manager of the rows that weren't soft deleted
+	'''
+	def get_queryset(self):
+		return super().get_queryset().filter(ALIVE)
+
+class SoftDeleteModel(models.Model):
+	'''
+	Base of the models that are soft deleted. `objects` keeps every row,
+	so the admin and the related managers see them all, and `alive` only
+	the live ones, that are served by the partial indexes of the models
+	'''
+	is_active = models.BooleanField(default=True)
+	is_deleted = models.BooleanField(default=False)
+	updated_date=models.DateTimeField(auto_now=True)
+	created_date = models.DateTimeField(auto_now_add=True)
+
+	objects = models.Manager()
+	alive = AliveManager()
+
+	class Meta:
+		abstract = True
+
+class Spots(SoftDeleteModel):
 	name = models.CharField( max_length = 100)
 	country = models.CharField( max_length = 100)
 	country_code = models.CharField( max_length = 5)
@@ -28,48 +67,93 @@ class Spots(models.Model):
 	lng = models.DecimalField(max_digits=22, decimal_places=16, blank=False, null=True)
 	geom = models.GeometryField(srid=4326,blank=False,null=True)
 	position = models.PointField(null=True, blank=False)	
+	# Copy of position kept in sync by a database trigger, to measure
+	# distances in meters with ST_DWithin over its GiST index
+	position_geog = models.PointField(geography=True, srid=4326, null=True, blank=True, spatial_index=False)
 	user = models.ForeignKey(User,related_name='spots_user_id',on_delete=models.CASCADE)
-	is_active = models.BooleanField(default=True)
-	is_deleted = models.BooleanField(default=False)
-	updated_date=models.DateTimeField(auto_now=True)
-	created_date = models.DateTimeField(auto_now_add=True)
+	# Address fields of pending spots are filled in by the enrich_spots command
+	enrichment_status = models.CharField(max_length=10, choices=ENRICHMENT_STATUS_CHOICES, default=ENRICHMENT_DONE)
 
-class Images(models.Model):
+	class Meta:
+		indexes = [
+			GistIndex(fields=['position_geog'], name='api_spots_position_geog_gist'),
+			models.Index(fields=['id'], name='api_spots_enrichment_pending', condition=models.Q(enrichment_status=ENRICHMENT_PENDING)),
+			# Places of a user, the newest first
+			models.Index(fields=['user', '-id'], name='api_spots_user_alive', condition=ALIVE),
+			# Keyset pages of the lists, the newest first
+			models.Index(fields=['-id'], name='api_spots_id_alive', condition=ALIVE),
+			# Last change of the table, the version of the spatial index
+			models.Index(fields=['updated_date'], name='api_spots_updated_date'),
+		]
+
+class Images(SoftDeleteModel):
 	url = models.URLField()
 	spot = models.ForeignKey(Spots,related_name='images_spot_id',on_delete=models.CASCADE)
 	#extension = models.CharField( max_length = 100)
 	principalimage = models.BooleanField(default=False)
-	is_active = models.BooleanField(default=True)
-	is_deleted = models.BooleanField(default=False)
-	updated_date=models.DateTimeField(auto_now=True)
-	created_date = models.DateTimeField(auto_now_add=True)
 
-class Tags(models.Model):
+	class Meta:
+		indexes = [
+			models.Index(fields=['spot'], name='api_images_spot_alive', condition=ALIVE),
+			models.Index(fields=['-id'], name='api_images_id_alive', condition=ALIVE),
+		]
+
+class Tags(SoftDeleteModel):
 	name = models.CharField( max_length = 100, blank=False, null=False)
-	is_active = models.BooleanField(default=True)
-	is_deleted = models.BooleanField(default=False)
-	updated_date=models.DateTimeField(auto_now=True)
-	created_date = models.DateTimeField(auto_now_add=True)
+	# Number of live spot tags of the tag, kept by a trigger on api_spottags
+	usage_count = models.PositiveIntegerField(default=0, editable=False)
 
-class TypesUserAction(models.Model):
+	class Meta:
+		constraints = [
+			# Concurrent requests can't create the same live tag twice
+			models.UniqueConstraint(fields=['name'], name='api_tags_name_alive_uniq', condition=ALIVE),
+		]
+		indexes = [
+			# Fuzzy (%) matches of the tag autocomplete. Its prefix matches use
+			# api_tags_name_prefix_alive, an index over lower(name) created
+			# with SQL in migration 0025
+			GinIndex(fields=['name'], name='api_tags_name_trgm', opclasses=['gin_trgm_ops'], condition=ALIVE),
+			# Most used tags, in the order of popular_tags, so it's read without sorting
+			models.Index(fields=['-usage_count', 'name'], name='api_tags_usage_count_alive', condition=ALIVE),
+			models.Index(fields=['-id'], name='api_tags_id_alive', condition=ALIVE),
+		]
+
+class TypesUserAction(SoftDeleteModel):
 	name = models.CharField( max_length = 100, blank=False, null=False)
-	is_active = models.BooleanField(default=True)
-	is_deleted = models.BooleanField(default=False)
-	updated_date=models.DateTimeField(auto_now=True)
-	created_date = models.DateTimeField(auto_now_add=True)
 
-class UserActions(models.Model):
+class UserActions(SoftDeleteModel):
 	type_user_action = models.ForeignKey(TypesUserAction,related_name='useractions_type_user_action_id',on_delete=models.CASCADE)
 	spot = models.ForeignKey(Spots,related_name='useractions_spot_id',on_delete=models.CASCADE)
-	is_active = models.BooleanField(default=True)
-	is_deleted = models.BooleanField(default=False)
-	updated_date=models.DateTimeField(auto_now=True)
-	created_date = models.DateTimeField(auto_now_add=True)
 
-class SpotTags(models.Model):
+	class Meta:
+		indexes = [
+			models.Index(fields=['spot', 'type_user_action'], name='api_useractions_spot_alive', condition=ALIVE),
+		]
+
+class SpotTags(SoftDeleteModel):
 	user_action = models.ForeignKey(UserActions,related_name='spottags_user_action_id',on_delete=models.CASCADE)
 	tag = models.ForeignKey(Tags,related_name='spottags_user_action_id',on_delete=models.CASCADE)
-	is_active = models.BooleanField(default=True)
-	is_deleted = models.BooleanField(default=False)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['user_action', 'tag'], name='api_spottags_user_action_tag_alive_uniq', condition=ALIVE),
+		]
+		indexes = [
+			# Spots with a tag, for the tag filters of the spatial searches
+			models.Index(fields=['tag', 'user_action'], name='api_spottags_tag_alive', condition=ALIVE),
+		]
+
+class ReverseGeocodeCache(models.Model):
+	'''
+	Geocoder answers for cells of coordinates rounded to precision decimals
+	'''
+	precision = models.PositiveSmallIntegerField()
+	cell_lat = models.DecimalField(max_digits=10, decimal_places=6)
+	cell_lng = models.DecimalField(max_digits=10, decimal_places=6)
+	place_information = JSONField()
+	expires_at = models.DateTimeField()
 	updated_date=models.DateTimeField(auto_now=True)
 	created_date = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		unique_together = ('precision','cell_lat','cell_lng')
@@ -0,0 +1,112 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .compact import (POLYLINE_PRECISION,encode_polyline,pack_int32,
+	nearby_results,nearby_points)
+
+try:
+	import orjson
+except ImportError:
+	orjson = None
+
+class MVTRenderer(BaseRenderer):
+	'''
+	Renderer for Mapbox Vector Tiles, that are already encoded
+	by PostGIS
+	'''
+	media_type = 'application/vnd.mapbox-vector-tile'
+	format = 'mvt'
+	charset = None
+	render_style = 'binary'
+
+	def render(self, data, accepted_media_type=None, renderer_context=None):
+		if isinstance(data, (bytes, bytearray)):
+			return data
+		return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+class FirstRendererContentNegotiation(BaseContentNegotiation):
+	'''
+	Always use the first renderer of the view, whatever the Accept
+	header of the client is
+	'''
+	def select_parser(self, request, parsers):
+		return parsers[0]
+
+	def select_renderer(self, request, renderers, format_suffix=None):
+		return (renderers[0], renderers[0].media_type)
+
+class FastJSONRenderer(JSONRenderer):
+	'''
+	JSON renderer for the responses built from plain rows. Uses orjson
+	when it's installed, the types it doesn't know (Decimal, dates) are
+	encoded as JSONRenderer does. Falls back to JSONRenderer without it,
+	or when an indented response is requested
+	'''
+	def render(self, data, accepted_media_type=None, renderer_context=None):
+		if orjson is None or data is None:
+			return super().render(data, accepted_media_type, renderer_context)
+
+		renderer_context = renderer_context or {}
+		if self.get_indent(accepted_media_type, renderer_context):
+			return super().render(data, accepted_media_type, renderer_context)
+
+		return orjson.dumps(
+			data,
+			default=JSONEncoder().default,
+			option=orjson.OPT_PASSTHROUGH_DATETIME
+		)
+
+class NearbyPolylineRenderer(JSONRenderer):
+	'''
+	nearby_places as JSON, with the places replaced by the array of
+	their ids and a Google encoded polyline of their coordinates
+	'''
+	media_type = 'application/vnd.spots.polyline+json'
+	format = 'polyline'
+
+	def render(self, data, accepted_media_type=None, renderer_context=None):
+		for entry in nearby_results(data):
+			ids, points = nearby_points(entry['nearby'])
+			compact = {
+				'ids': ids,
+				'polyline': encode_polyline(points),
+				'precision': POLYLINE_PRECISION
+			}
+			# Meters to each place, in the nearest neighbour mode
+			if entry['nearby'] and 'distance' in entry['nearby'][0]:
+				compact['distances'] = [round(spot['distance'], 1) for spot in entry['nearby']]
+			entry['nearby'] = compact
+
+		return super().render(data, accepted_media_type, renderer_context)
+
+class NearbyInt32Renderer(BaseRenderer):
+	'''
+	nearby_places as a packed little-endian int32 buffer (see
+	pack_int32). The next_cursor of the nearest neighbour mode is sent
+	in the X-Next-Cursor header. Error responses are sent as JSON
+	'''
+	media_type = 'application/vnd.spots.int32'
+	format = 'int32'
+	charset = None
+	render_style = 'binary'
+
+	def render(self, data, accepted_media_type=None, renderer_context=None):
+		results = nearby_results(data)
+		response = (renderer_context or {}).get('response')
+		if not results:
+			# The Content-Type header is set before rendering, so it's
+			# replaced too, otherwise the JSON is labelled as int32
+			if response is not None:
+				response.content_type = 'application/json'
+				response['Content-Type'] = response.content_type
+			return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+		entry = results[0]
+		if response is not None and entry.get('next_cursor'):
+			response['X-Next-Cursor'] = entry['next_cursor']
+
+		return pack_int32(*nearby_points(entry['nearby']))
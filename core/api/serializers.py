@@ -3,6 +3,10 @@ from .models import (User,Spots,Images,Tags,TypesUserAction,UserActions,
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.gis.geos import GEOSGeometry
+from .spatial import decode_cursor
+from core.settings import (knn_max_k,tiles_max_zoom,batch_max_probes,
+    tags_filter_max,tags_autocomplete_max,spots_bulk_delete_max,
+    spots_page_size_max)
 User = get_user_model()
 
 class DynamicFieldsModelSerializer(serializers.ModelSerializer):
@@ -15,6 +19,7 @@ class DynamicFieldsModelSerializer(serializers.ModelSerializer):
         fields = kwargs.pop("fields", None)
         excluded_fields = kwargs.pop("excluded_fields", None)
         required_fields = kwargs.pop("required_fields", None)
+        optional_fields = kwargs.pop("optional_fields", None)
 
         # Instantiate the superclass normally
         super(DynamicFieldsModelSerializer, self).__init__(*args, **kwargs)
@@ -39,6 +44,10 @@ class DynamicFieldsModelSerializer(serializers.ModelSerializer):
             for field_name in required_fields:
                 self.fields[field_name].required = True
 
+        if optional_fields is not None:
+            for field_name in optional_fields:
+                self.fields[field_name].required = False
+
 class UserSerializer(DynamicFieldsModelSerializer,serializers.ModelSerializer):
 	class Meta:
 		model = User
@@ -47,7 +56,8 @@ class UserSerializer(DynamicFieldsModelSerializer,serializers.ModelSerializer):
 class SpotsSerializer(DynamicFieldsModelSerializer,serializers.ModelSerializer):
     class Meta:
         model = Spots
-        fields = ('__all__')
+        exclude = ('position_geog',)
+        read_only_fields = ('enrichment_status',)
 
     def create(self, validated_data):
         instance = Spots.objects.create(**validated_data)
@@ -57,18 +67,36 @@ class SpotsSerializer(DynamicFieldsModelSerializer,serializers.ModelSerializer):
         return instance
 
 class UserPlacesAPISerializer(serializers.ModelSerializer):
+    page_size = serializers.IntegerField(
+        required=False, min_value=1, max_value=spots_page_size_max,
+        help_text="Optional. Number of places of each page, newest first. Without it every place is returned"
+    )
+    cursor = serializers.CharField(
+        required=False,
+        help_text="Optional. next_cursor returned by the previous page"
+    )
     class Meta:
         model = Spots
-        fields = ('user',)
+        fields = ('user','page_size','cursor')
+
+    def validate_cursor(self, value):
+        try:
+            spot_id, = decode_cursor(value)
+            return int(spot_id)
+        except (ValueError, TypeError) as e:
+            raise serializers.ValidationError("Invalid cursor")
 
 class CreateSpotAPISerializer(DynamicFieldsModelSerializer,serializers.ModelSerializer):
     tag_list = serializers.ListField(
         child=serializers.CharField(max_length=100),
         help_text="Tag list that you can optional relate with the place",
         allow_empty=True)
+    defer_enrichment = serializers.BooleanField(
+        required=False, default=False,
+        help_text="Save the place without its address fields and let the enrich_spots command fill them in")
     class Meta:
         model = Spots
-        fields = ('__all__')
+        exclude = ('position_geog','enrichment_status')
 
 class PlaceInformationAPISerializer(serializers.ModelSerializer):
     latitude = serializers.DecimalField(
@@ -79,7 +107,23 @@ class PlaceInformationAPISerializer(serializers.ModelSerializer):
         model = Spots
         fields = ('latitude','longitude')
 
-class NearbyPlacesAPISerializer(serializers.ModelSerializer):
+class TagFiltersSerializer(serializers.Serializer):
+    """
+    Optional tag filters of the spatial searches
+    """
+    tags_any = serializers.ListField(
+        child=serializers.CharField(max_length=100),
+        required=False, allow_empty=False, max_length=tags_filter_max,
+        help_text="Optional. Only get the places with any of these tags")
+    tags_all = serializers.ListField(
+        child=serializers.CharField(max_length=100),
+        required=False, allow_empty=False, max_length=tags_filter_max,
+        help_text="Optional. Only get the places with all of these tags")
+
+    def validate_tags_all(self, value):
+        return list(dict.fromkeys(value))
+
+class NearbyPlacesAPISerializer(TagFiltersSerializer,serializers.ModelSerializer):
     latitude = serializers.DecimalField(
         source='lat',max_digits=22, decimal_places=16, required=True,help_text="Latitude of your geographic coordinate")
     longitude = serializers.DecimalField(
@@ -88,9 +132,101 @@ class NearbyPlacesAPISerializer(serializers.ModelSerializer):
         required=True,
         help_text="Distance in kilometers. A suggested value could be from 1-5 kilometers, to display nearby places"
     )
+    k = serializers.IntegerField(
+        required=False, min_value=1, max_value=knn_max_k,
+        help_text="Optional. Get the k nearest places ordered by distance, instead of every place within max_distance"
+    )
+    cursor = serializers.CharField(
+        required=False,
+        help_text="Optional. next_cursor returned by the previous page of the k nearest places"
+    )
     class Meta:
         model = Spots
-        fields = ('latitude','longitude','max_distance','user')
+        fields = ('latitude','longitude','max_distance','user','k','cursor','tags_any','tags_all')
+
+    def validate_cursor(self, value):
+        try:
+            cursor = decode_cursor(value)
+            knn, spot_id = cursor
+            return [float(knn), int(spot_id)]
+        except (ValueError, TypeError) as e:
+            raise serializers.ValidationError("Invalid cursor")
+
+class BoundingBoxAPISerializer(TagFiltersSerializer,serializers.ModelSerializer):
+    min_lat = serializers.DecimalField(
+        max_digits=22, decimal_places=16, min_value=-90, max_value=90, help_text="South latitude of the viewport")
+    min_lng = serializers.DecimalField(
+        max_digits=22, decimal_places=16, min_value=-180, max_value=180, help_text="West longitude of the viewport")
+    max_lat = serializers.DecimalField(
+        max_digits=22, decimal_places=16, min_value=-90, max_value=90, help_text="North latitude of the viewport")
+    max_lng = serializers.DecimalField(
+        max_digits=22, decimal_places=16, min_value=-180, max_value=180, help_text="East longitude of the viewport")
+    class Meta:
+        model = Spots
+        fields = ('min_lat','min_lng','max_lat','max_lng','tags_any','tags_all')
+
+    def validate(self, data):
+        if data['min_lat'] > data['max_lat'] or data['min_lng'] > data['max_lng']:
+            raise serializers.ValidationError("The minimum latitude and longitude must be lower than the maximum")
+        return data
+
+class ViewportClustersAPISerializer(BoundingBoxAPISerializer):
+    zoom = serializers.IntegerField(
+        min_value=0, max_value=tiles_max_zoom, help_text="Zoom level of the map")
+    class Meta:
+        model = Spots
+        fields = ('min_lat','min_lng','max_lat','max_lng','zoom','tags_any','tags_all')
+
+class SpotTileAPISerializer(serializers.ModelSerializer):
+    z = serializers.IntegerField(
+        min_value=0, max_value=tiles_max_zoom, help_text="Zoom level of the tile")
+    x = serializers.IntegerField(
+        min_value=0, help_text="Column of the tile")
+    y = serializers.IntegerField(
+        min_value=0, help_text="Row of the tile")
+    class Meta:
+        model = Spots
+        fields = ('z','x','y')
+
+    def validate(self, data):
+        if data['x'] >= 2 ** data['z'] or data['y'] >= 2 ** data['z']:
+            raise serializers.ValidationError("The tile doesn't exist in the zoom level requested")
+        return data
+
+class NearbyProbeAPISerializer(serializers.ModelSerializer):
+    latitude = serializers.DecimalField(
+        source='lat',max_digits=22, decimal_places=16, required=True,help_text="Latitude of the geographic coordinate")
+    longitude = serializers.DecimalField(
+        source='lng',max_digits=22, decimal_places=16, required=True,help_text="Longitude of the geographic coordinate")
+    max_distance = serializers.IntegerField(
+        required=True,
+        help_text="Distance in kilometers around the coordinate"
+    )
+    class Meta:
+        model = Spots
+        fields = ('latitude','longitude','max_distance')
+
+class BatchNearbyPlacesAPISerializer(TagFiltersSerializer,serializers.ModelSerializer):
+    probes = NearbyProbeAPISerializer(
+        many=True, allow_empty=False,
+        help_text="List of coordinates to get their nearby places")
+    class Meta:
+        model = Spots
+        fields = ('probes','tags_any','tags_all')
+
+    def validate_probes(self, value):
+        if len(value) > batch_max_probes:
+            raise serializers.ValidationError("Ensure this field has no more than {} elements".format(batch_max_probes))
+        return value
+
+class BulkDeleteSpotsAPISerializer(serializers.ModelSerializer):
+    spot_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False, max_length=spots_bulk_delete_max,
+        help_text="Ids of the places to delete")
+    class Meta:
+        model = Spots
+        fields = ('spot_ids',)
 
 class SpotDetailsAPISerializer(serializers.ModelSerializer):
     spot_id = serializers.IntegerField(source='id')
@@ -119,6 +255,40 @@ class TagsSerializer(DynamicFieldsModelSerializer,serializers.ModelSerializer):
 		model = Tags
 		fields = ('__all__')
 
+class TagAutocompleteAPISerializer(serializers.ModelSerializer):
+    query = serializers.CharField(
+        max_length=100, trim_whitespace=True,
+        help_text="Beginning or approximate spelling of the tag name")
+    limit = serializers.IntegerField(
+        required=False, default=10, min_value=1, max_value=tags_autocomplete_max,
+        help_text="Optional. Number of suggestions")
+    class Meta:
+        model = Tags
+        fields = ('query','limit')
+
+class PopularTagsAPISerializer(serializers.ModelSerializer):
+    latitude = serializers.DecimalField(
+        max_digits=22, decimal_places=16, required=False, min_value=-90, max_value=90,
+        help_text="Optional. Latitude of the center of the radius")
+    longitude = serializers.DecimalField(
+        max_digits=22, decimal_places=16, required=False, min_value=-180, max_value=180,
+        help_text="Optional. Longitude of the center of the radius")
+    max_distance = serializers.IntegerField(
+        required=False, min_value=1,
+        help_text="Optional. Radius in kilometers, to only count the tags of the places within it")
+    limit = serializers.IntegerField(
+        required=False, default=10, min_value=1, max_value=tags_autocomplete_max,
+        help_text="Optional. Number of tags")
+    class Meta:
+        model = Tags
+        fields = ('latitude','longitude','max_distance','limit')
+
+    def validate(self, data):
+        radius = [field for field in ('latitude','longitude','max_distance') if field in data]
+        if radius and len(radius) < 3:
+            raise serializers.ValidationError("latitude, longitude and max_distance must be sent together")
+        return data
+
 class TypesUserActionSerializer(DynamicFieldsModelSerializer,serializers.ModelSerializer):
 	class Meta:
 		model = TypesUserAction
@@ -0,0 +1,25 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Spots
+from . import spatial_index
+from .tiles import invalidate_spot_tiles
+
+@receiver(post_save, sender=Spots)
+def spot_saved(sender, instance, **kwargs):
+	'''
+	Keep the in-memory spatial index of this worker and the cached map
+	tiles in sync
+	'''
+	spatial_index.update_spot(instance)
+	invalidate_spot_tiles(instance)
+
+@receiver(post_delete, sender=Spots)
+def spot_deleted(sender, instance, **kwargs):
+	'''
+	Drop a hard deleted spot from the in-memory spatial index of this
+	worker, the rest of the workers see the delete in the version of
+	the table. Also drop its cached map tiles
+	'''
+	spatial_index.remove_spot(instance)
+	invalidate_spot_tiles(instance)
@@ -0,0 +1,288 @@
+import base64
+import json
+import logging
+
+from django.contrib.gis.geos import Polygon
+from django.db import connection
+from django.db.models import Exists, OuterRef
+
+from .models import Spots, SpotTags, Tags, UserActions
+from core.settings import (cluster_cell_pixels,cluster_max,stream_chunk_size,
+	batch_max_rows)
+
+KNN_SQL = '''
+	SELECT id, lat, lng,
+		ST_Distance(position_geog, {point}) AS distance,
+		position_geog <-> {point} AS knn
+	FROM {table}
+	WHERE is_active AND NOT is_deleted
+		AND ST_DWithin(position_geog, {point}, %(meters)s)
+		{after}
+		{tags}
+	ORDER BY position_geog <-> {point}, id
+	LIMIT %(limit)s
+'''
+
+CLUSTERS_SQL = '''
+	SELECT count(*), avg(ST_X(position)), avg(ST_Y(position)), min(id)
+	FROM {table}
+	WHERE is_active AND NOT is_deleted
+		AND position && ST_MakeEnvelope(%(min_lng)s, %(min_lat)s, %(max_lng)s, %(max_lat)s, 4326)
+		{tags}
+	GROUP BY ST_SnapToGrid(position, %(cell)s)
+	ORDER BY count(*) DESC
+	LIMIT %(limit)s
+'''
+
+PROBE_POINT_SQL = 'ST_SetSRID(ST_MakePoint(probe.lng, probe.lat), 4326)::geography'
+
+BATCH_NEARBY_SQL = '''
+	SELECT probe.idx, hit.id, hit.lat, hit.lng, hit.distance
+	FROM unnest(%(idx)s::integer[], %(lng)s::float8[], %(lat)s::float8[], %(meters)s::float8[])
+		AS probe(idx, lng, lat, meters)
+	CROSS JOIN LATERAL (
+		SELECT s.id, s.lat, s.lng, ST_Distance(s.position_geog, {point}) AS distance
+		FROM {table} s
+		WHERE s.is_active AND NOT s.is_deleted
+			AND ST_DWithin(s.position_geog, {point}, probe.meters)
+			{tags}
+		ORDER BY s.position_geog <-> {point}
+		LIMIT %(limit)s
+	) hit
+	ORDER BY probe.idx, hit.distance
+	LIMIT %(limit)s
+'''
+
+POINT_SQL = 'ST_SetSRID(ST_MakePoint(%(lng)s, %(lat)s), 4326)::geography'
+
+# Spots with one of the tag names of a list. Driven by the index of the
+# live spot tags by tag, and the index of the live user actions by spot
+TAG_EXISTS_SQL = '''
+	AND EXISTS (
+		SELECT 1
+		FROM {useractions} ua
+		JOIN {spottags} st ON st.user_action_id = ua.id
+		JOIN {tags} t ON t.id = st.tag_id
+		WHERE ua.spot_id = {spot_id}
+			AND ua.type_user_action_id = 1
+			AND ua.is_active AND NOT ua.is_deleted
+			AND st.is_active AND NOT st.is_deleted
+			AND t.name = ANY({names})
+	)
+'''
+
+def tags_filter_sql(spot_id, tags_any=None, tags_all=None):
+	'''
+	Build the SQL conditions that keep the spots with any of the tags_any
+	names and all of the tags_all names. spot_id is the column of the
+	outer query with the id of the spot. Returns the conditions and
+	their params
+	'''
+	tables = {
+		'useractions': UserActions._meta.db_table,
+		'spottags': SpotTags._meta.db_table,
+		'tags': Tags._meta.db_table,
+		'spot_id': spot_id
+	}
+	conditions = []
+	params = {}
+
+	if tags_any:
+		conditions.append(TAG_EXISTS_SQL.format(names='%(tags_any)s', **tables))
+		params['tags_any'] = list(tags_any)
+
+	# One EXISTS for each tag, so each one is answered by the indexes
+	for position, name in enumerate(tags_all or []):
+		key = 'tags_all_{}'.format(position)
+		conditions.append(TAG_EXISTS_SQL.format(names='%({})s'.format(key), **tables))
+		params[key] = [name]
+
+	return ''.join(conditions), params
+
+def tagged_spots(tag_names):
+	'''
+	Live spot tags of the outer spot with one of the tag names
+	'''
+	return SpotTags.alive.filter(
+		user_action__spot_id=OuterRef('id'),
+		user_action__type_user_action_id=1,
+		user_action__is_active=True,
+		user_action__is_deleted=False,
+		tag__name__in=tag_names
+	)
+
+def filter_tags(queryset, tags_any=None, tags_all=None):
+	'''
+	Same conditions as tags_filter_sql, for a Spots queryset
+	'''
+	if tags_any:
+		queryset = queryset.filter(Exists(tagged_spots(tags_any)))
+
+	for name in tags_all or []:
+		queryset = queryset.filter(Exists(tagged_spots([name])))
+
+	return queryset
+
+def encode_cursor(*values):
+	'''
+	Build an opaque cursor from the sort key of the last row of a page
+	'''
+	return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor):
+	'''
+	Inverse of encode_cursor, raise ValueError if the cursor is malformed
+	'''
+	try:
+		return json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+	except Exception as e:
+		raise ValueError("Invalid cursor")
+
+def nearest_spots(latitude, longitude, k, max_distance, cursor=None,
+	tags_any=None, tags_all=None):
+	'''
+	Get the k nearest active spots to a point within max_distance
+	kilometers, in a single query ordered by the PostGIS <-> operator
+	so the GiST index over position_geog drives the scan.
+
+	cursor is the decoded next_cursor of the previous page. tags_any
+	and tags_all optionally filter the spots by their tag names. Returns
+	the rows (id, lat, lng and distance in meters) and the next_cursor,
+	that is None on the last page
+	'''
+	params = {
+		'lat': float(latitude),
+		'lng': float(longitude),
+		'meters': float(max_distance) * 1000,
+		'limit': k + 1
+	}
+	after = ''
+	if cursor:
+		after = 'AND (position_geog <-> {point}, id) > (%(knn)s, %(id)s)'.format(point=POINT_SQL)
+		params['knn'], params['id'] = cursor
+
+	table = Spots._meta.db_table
+	tags, tags_params = tags_filter_sql(table + '.id', tags_any, tags_all)
+	params.update(tags_params)
+
+	sql = KNN_SQL.format(point=POINT_SQL,table=table,after=after,tags=tags)
+
+	with connection.cursor() as db_cursor:
+		db_cursor.execute(sql, params)
+		result = db_cursor.fetchall()
+
+	rows = [
+		{'id': spot_id, 'lat': lat, 'lng': lng, 'distance': distance}
+		for spot_id, lat, lng, distance, knn in result[:k]
+	]
+
+	next_cursor = None
+	if len(result) > k:
+		last = result[k - 1]
+		next_cursor = encode_cursor(last[4], last[0])
+
+	return rows, next_cursor
+
+def batch_nearby_spots(probes, tags_any=None, tags_all=None):
+	'''
+	Resolve several radius searches in a single statement, with a LATERAL
+	join that runs an index-driven search for each probe. probes is a
+	list of dicts with lat, lng and max_distance in kilometers, and the
+	tag filters apply to all of them.
+
+	Returns the nearby places of each probe (nearest first) keyed by the
+	position of the probe, and if the result was truncated because it
+	had more than batch_max_rows rows
+	'''
+	tags, params = tags_filter_sql('s.id', tags_any, tags_all)
+	sql = BATCH_NEARBY_SQL.format(point=PROBE_POINT_SQL,table=Spots._meta.db_table,tags=tags)
+
+	params.update({
+		'idx': list(range(len(probes))),
+		'lng': [float(probe['lng']) for probe in probes],
+		'lat': [float(probe['lat']) for probe in probes],
+		'meters': [float(probe['max_distance']) * 1000 for probe in probes],
+		'limit': batch_max_rows + 1
+	})
+
+	with connection.cursor() as db_cursor:
+		db_cursor.execute(sql, params)
+		result = db_cursor.fetchall()
+
+	nearby = {idx: [] for idx in range(len(probes))}
+	for idx, spot_id, lat, lng, distance in result[:batch_max_rows]:
+		nearby[idx].append({'id': spot_id, 'lat': lat, 'lng': lng, 'distance': distance})
+
+	return nearby, len(result) > batch_max_rows
+
+def cluster_size(zoom):
+	'''
+	Side in degrees of the grid cells used to cluster spots at a zoom
+	level, so a cluster covers about cluster_cell_pixels on the screen
+	'''
+	return 360.0 / (256 * 2 ** zoom) * cluster_cell_pixels
+
+def viewport_clusters(min_lat, min_lng, max_lat, max_lng, zoom,
+	tags_any=None, tags_all=None):
+	'''
+	Group the active spots inside a bounding box in a grid that depends
+	on the zoom level, with ST_SnapToGrid. Returns the count and the
+	centroid of each cluster, and the spot_id of clusters with a single
+	spot, biggest clusters first
+	'''
+	table = Spots._meta.db_table
+	tags, params = tags_filter_sql(table + '.id', tags_any, tags_all)
+	sql = CLUSTERS_SQL.format(table=table,tags=tags)
+
+	params.update({
+		'min_lat': float(min_lat),
+		'min_lng': float(min_lng),
+		'max_lat': float(max_lat),
+		'max_lng': float(max_lng),
+		'cell': cluster_size(zoom),
+		'limit': cluster_max
+	})
+
+	with connection.cursor() as db_cursor:
+		db_cursor.execute(sql, params)
+		result = db_cursor.fetchall()
+
+	return [
+		{
+			'count': count,
+			'lat': lat,
+			'lng': lng,
+			'spot_id': spot_id if count == 1 else None
+		}
+		for count, lng, lat, spot_id in result
+	]
+
+def viewport_features(min_lat, min_lng, max_lat, max_lng, tags_any=None, tags_all=None):
+	'''
+	Generate a GeoJSON FeatureCollection, piece by piece, with the active
+	spots inside a bounding box. The rows are filtered with the && operator
+	over the spatial index and read from a server side cursor, so the
+	result is never loaded in memory as a whole
+	'''
+	envelope = Polygon.from_bbox((min_lng, min_lat, max_lng, max_lat))
+	envelope.srid = 4326
+
+	queryset = filter_tags(Spots.alive.filter(
+		position__bboverlaps=envelope
+	), tags_any, tags_all).values_list('id','name','lng','lat').order_by('id')
+
+	yield '{"type": "FeatureCollection", "features": ['
+	separator = ''
+	try:
+		for spot_id, name, lng, lat in queryset.iterator(chunk_size=stream_chunk_size):
+			yield separator + json.dumps({
+				'type': 'Feature',
+				'id': spot_id,
+				'geometry': {'type': 'Point', 'coordinates': [float(lng), float(lat)]},
+				'properties': {'name': name}
+			})
+			separator = ','
+	except Exception as e:
+		# The status code was already sent, so the error can only be logged
+		logging.getLogger('error_logger').exception("[API - viewport_features] - Error: " + str(e))
+	yield ']}'
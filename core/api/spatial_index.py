@@ -0,0 +1,296 @@
+import logging
+import math
+import sys
+import threading
+import time
+from array import array
+from datetime import timedelta
+
+from django.db import connection
+
+from .models import Spots
+from core.settings import (spatial_index_enabled,spatial_index_cell_size,
+	spatial_index_max_spots,spatial_index_check_interval)
+
+EARTH_RADIUS = 6371008.8
+
+# Length of one degree of latitude in meters
+METERS_PER_DEGREE = 111320.0
+
+def haversine(lat1, lng1, lat2, lng2):
+	'''
+	Distance in meters between two points over a sphere
+	'''
+	lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+	a = (math.sin((lat2 - lat1) / 2) ** 2 +
+		math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+	return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+class SpotsGridIndex(object):
+	'''
+	Uniform grid over latitude and longitude with the active spots.
+
+	Rows are stored in compact arrays (id, user, lat, lng) and every cell
+	keeps the slots of its rows, so a radius lookup only visits the cells
+	around the requested point. Removed rows leave a tombstone (-1 id)
+	that disappears in the next rebuild
+	'''
+	def __init__(self, cell_size, max_spots):
+		self.cell_size = cell_size
+		self.max_spots = max_spots
+		self.columns = int(math.ceil(360 / cell_size))
+		self.ids = array('i')
+		self.users = array('i')
+		self.lats = array('d')
+		self.lngs = array('d')
+		self.cells = {}
+		self.slots = {}
+		self.version = None
+		self.overflow = False
+		self.lock = threading.RLock()
+
+	def cell(self, lat, lng):
+		return (
+			int(math.floor((lat + 90) / self.cell_size)),
+			int(math.floor((lng + 180) / self.cell_size)) % self.columns
+		)
+
+	def add(self, spot_id, user_id, lat, lng):
+		'''
+		Insert or move a spot. When max_spots is reached the index is
+		flagged as overflowed and stops answering lookups
+		'''
+		with self.lock:
+			self.remove(spot_id)
+
+			if len(self.slots) >= self.max_spots:
+				self.overflow = True
+				return
+
+			lat = float(lat)
+			lng = float(lng)
+			slot = len(self.ids)
+			self.ids.append(spot_id)
+			self.users.append(user_id)
+			self.lats.append(lat)
+			self.lngs.append(lng)
+			self.slots[spot_id] = slot
+			self.cells.setdefault(self.cell(lat, lng), array('i')).append(slot)
+
+	def remove(self, spot_id):
+		with self.lock:
+			slot = self.slots.pop(spot_id, None)
+
+			if slot is not None:
+				key = self.cell(self.lats[slot], self.lngs[slot])
+				self.cells[key].remove(slot)
+				if not self.cells[key]:
+					del self.cells[key]
+				self.ids[slot] = -1
+
+	def nearby(self, lat, lng, meters):
+		'''
+		Return the slots of the spots within meters of the point,
+		ordered by spot id
+		'''
+		lat = float(lat)
+		lng = float(lng)
+		dlat = meters / METERS_PER_DEGREE
+		if abs(lat) + dlat >= 90.0:
+			# The circle contains a pole, so it covers every longitude
+			dlng = 180.0
+		else:
+			cos_lat = math.cos(math.radians(abs(lat) + dlat))
+			dlng = min(meters / (METERS_PER_DEGREE * cos_lat), 180.0)
+
+		first_row, first_column = self.cell(max(lat - dlat, -90.0), lng - dlng)
+		last_row, last_column = self.cell(min(lat + dlat, 90.0), lng + dlng)
+		if dlng >= 180.0:
+			columns = range(self.columns)
+		elif last_column >= first_column:
+			columns = range(first_column, last_column + 1)
+		else:
+			# The box crosses the antimeridian
+			columns = list(range(first_column, self.columns)) + list(range(0, last_column + 1))
+
+		found = []
+		with self.lock:
+			for row in range(first_row, last_row + 1):
+				for column in columns:
+					for slot in self.cells.get((row, column), ()):
+						if haversine(lat, lng, self.lats[slot], self.lngs[slot]) <= meters:
+							found.append(slot)
+
+		found.sort(key=lambda slot: self.ids[slot])
+		return found
+
+	def nearby_places(self, lat, lng, max_distance, user):
+		'''
+		Same answer as the radius search of SpotsViewSet.nearby_places:
+		the places within max_distance kilometers, or None if the user
+		doesn't have any place there
+		'''
+		slots = self.nearby(lat, lng, float(max_distance) * 1000)
+
+		if not any(self.users[slot] == int(user) for slot in slots):
+			return None
+
+		return [
+			{'id': self.ids[slot], 'lat': self.lats[slot], 'lng': self.lngs[slot]}
+			for slot in slots
+		]
+
+	def memory_usage(self):
+		'''
+		Approximate size in bytes of the arrays and the lookup tables
+		'''
+		size = sum(
+			sys.getsizeof(rows)
+			for rows in (self.ids, self.users, self.lats, self.lngs)
+		)
+		size += sys.getsizeof(self.cells) + sum(sys.getsizeof(slots) for slots in self.cells.values())
+		size += sys.getsizeof(self.slots)
+		return size
+
+	def stats(self):
+		return {
+			'spots': len(self.slots),
+			'tombstones': len(self.ids) - len(self.slots),
+			'cells': len(self.cells),
+			'memory_bytes': self.memory_usage(),
+			'max_spots': self.max_spots,
+			'overflow': self.overflow
+		}
+
+_index = None
+_checked_at = 0
+# Held by the thread that refreshes the index
+_build_lock = threading.Lock()
+
+DELTA_OVERLAP = timedelta(seconds=60)
+
+# The last updated_date and id are read from the end of their indexes.
+# Hard deletes don't leave any other trace, so the deleted rows counter
+# of the table statistics is part of the version too
+VERSION_SQL = '''
+	SELECT
+		(SELECT max(updated_date) FROM {table}),
+		(SELECT max(id) FROM {table}),
+		(SELECT n_tup_del FROM pg_stat_user_tables WHERE relid = '{table}'::regclass)
+'''
+
+def database_version():
+	'''
+	Cheap fingerprint of the Spots table, it changes with every insert,
+	every update that sets updated_date and every delete, without
+	scanning the table
+	'''
+	with connection.cursor() as cursor:
+		cursor.execute(VERSION_SQL.format(table=Spots._meta.db_table))
+		return tuple(cursor.fetchone())
+
+def build_index(version):
+	index = SpotsGridIndex(spatial_index_cell_size, spatial_index_max_spots)
+	index.version = version
+
+	queryset = Spots.alive.filter(
+		lat__isnull=False,
+		lng__isnull=False
+	).values_list('id','user_id','lat','lng')
+
+	for spot_id, user_id, lat, lng in queryset.iterator(chunk_size=10000):
+		index.add(spot_id, user_id, lat, lng)
+		if index.overflow:
+			break
+
+	if index.overflow:
+		logging.getLogger('error_logger').error(
+			"[Spots index] - More than %s active spots, the index is disabled" % spatial_index_max_spots)
+	else:
+		logging.getLogger('info_logger').info("[Spots index] - Rebuilt: %s" % index.stats())
+
+	return index
+
+def apply_changes(index, version):
+	'''
+	Apply to the index the spots updated since its version, soft deleted
+	ones included, over the api_spots_updated_date index. updated_date is
+	set before the commit, so the last DELTA_OVERLAP seconds are read
+	again for the transactions that committed late
+	'''
+	queryset = Spots.objects.all()
+	if index.version[0] is not None:
+		queryset = queryset.filter(updated_date__gte=index.version[0] - DELTA_OVERLAP)
+
+	for spot_id, user_id, lat, lng, is_active, is_deleted in queryset.values_list(
+			'id','user_id','lat','lng','is_active','is_deleted').iterator(chunk_size=10000):
+		if is_active and not is_deleted and lat is not None and lng is not None:
+			index.add(spot_id, user_id, lat, lng)
+		else:
+			index.remove(spot_id)
+
+	index.version = version
+
+def refresh_index():
+	'''
+	Bring the index of this worker up to date with the table: the changes
+	are applied to it, and it's only rebuilt the first time, after rows
+	were hard deleted or when it overflowed. The new index replaces the
+	previous one once it's complete
+	'''
+	global _index
+
+	try:
+		version = database_version()
+		if _index is None or _index.overflow or _index.version[2] != version[2]:
+			if _index is None or _index.version != version:
+				_index = build_index(version)
+		elif _index.version != version:
+			apply_changes(_index, version)
+	except Exception as e:
+		logging.getLogger('error_logger').exception("[Spots index] - Error: " + str(e))
+	finally:
+		# The thread has its own database connection
+		connection.close()
+		_build_lock.release()
+
+def get_spots_index():
+	'''
+	Return the spatial index of this worker, or None when it's disabled,
+	still being built or the active spots don't fit in max_spots.
+
+	Every check_interval seconds the index is refreshed by a background
+	thread (see refresh_index), so requests never wait for it and keep
+	using the current index in the meantime
+	'''
+	global _checked_at
+
+	if not spatial_index_enabled:
+		return None
+
+	if time.time() - _checked_at >= spatial_index_check_interval and _build_lock.acquire(blocking=False):
+		_checked_at = time.time()
+		threading.Thread(target=refresh_index, daemon=True).start()
+
+	if _index is None or _index.overflow:
+		return None
+	return _index
+
+def update_spot(spot):
+	'''
+	Apply a saved spot to the index of this worker, if it was built
+	'''
+	if _index is None:
+		return
+
+	if spot.is_active and not spot.is_deleted and spot.lat is not None and spot.lng is not None:
+		_index.add(spot.id, spot.user_id, spot.lat, spot.lng)
+	else:
+		_index.remove(spot.id)
+
+def remove_spot(spot):
+	'''
+	Drop a deleted spot from the index of this worker, if it was built
+	'''
+	if _index is not None:
+		_index.remove(spot.id)
@@ -0,0 +1,116 @@
+from django.db import connection
+
+from .models import Spots, Tags, SpotTags, UserActions
+from .spatial import POINT_SQL
+from core.settings import tags_autocomplete_candidates
+
+# The prefix and the fuzzy matches are read separately, each one limited
+# to its most used tags, so a short query never ranks every tag. The
+# prefix matches are a range of the api_tags_name_prefix_alive index
+# (lower(name) text_pattern_ops, usage_count), the fuzzy ones come from
+# the trigram index and are sorted by usage_count before the limit
+AUTOCOMPLETE_SQL = '''
+	WITH candidates AS (
+		(
+			SELECT id, name, usage_count
+			FROM {tags}
+			WHERE is_active AND NOT is_deleted
+				AND lower(name) LIKE lower(%(prefix)s)
+			ORDER BY usage_count DESC
+			LIMIT %(candidates)s
+		)
+		UNION
+		(
+			SELECT id, name, usage_count
+			FROM {tags}
+			WHERE is_active AND NOT is_deleted
+				AND name %% %(query)s
+			ORDER BY usage_count DESC
+			LIMIT %(candidates)s
+		)
+	)
+	SELECT id, name, usage_count
+	FROM candidates
+	ORDER BY name ILIKE %(prefix)s DESC, usage_count DESC, similarity(name, %(query)s) DESC, name
+	LIMIT %(limit)s
+'''
+
+# Tags of the spots within a radius, counted over the spots found by the
+# spatial index, the most used globally first on ties
+NEARBY_POPULAR_TAGS_SQL = '''
+	SELECT t.id, t.name, count(*) AS usage_count
+	FROM {spots} s
+	JOIN {useractions} ua ON ua.spot_id = s.id
+		AND ua.type_user_action_id = 1
+		AND ua.is_active AND NOT ua.is_deleted
+	JOIN {spottags} st ON st.user_action_id = ua.id
+		AND st.is_active AND NOT st.is_deleted
+	JOIN {tags} t ON t.id = st.tag_id
+	WHERE s.is_active AND NOT s.is_deleted
+		AND ST_DWithin(s.position_geog, {point}, %(meters)s)
+	GROUP BY t.id
+	ORDER BY count(*) DESC, t.usage_count DESC, t.name
+	LIMIT %(limit)s
+'''
+
+def like_prefix(query):
+	'''
+	LIKE pattern of the values that start with query
+	'''
+	return query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+def autocomplete_tags(query, limit):
+	'''
+	Suggest active tags for what the user is typing: tags that start with
+	query first, then similar tags (pg_trgm), each group ranked by their
+	usage_count. Both matches are answered by the trigram GIN index
+	over the active tag names
+	'''
+	sql = AUTOCOMPLETE_SQL.format(tags=Tags._meta.db_table)
+
+	with connection.cursor() as db_cursor:
+		db_cursor.execute(sql, {
+			'query': query,
+			'prefix': like_prefix(query),
+			'candidates': tags_autocomplete_candidates,
+			'limit': limit
+		})
+		result = db_cursor.fetchall()
+
+	return [
+		{'id': tag_id, 'name': name, 'usage_count': usage_count}
+		for tag_id, name, usage_count in result
+	]
+
+def popular_tags(limit, latitude=None, longitude=None, max_distance=None):
+	'''
+	Get the most used active tags, read from their usage_count over its
+	index. With a coordinate and max_distance in kilometers, only the
+	tags of the spots within that radius are counted
+	'''
+	if max_distance is None:
+		return list(Tags.alive.filter(
+			usage_count__gt=0
+		).order_by('-usage_count','name').values('id','name','usage_count')[:limit])
+
+	sql = NEARBY_POPULAR_TAGS_SQL.format(
+		spots=Spots._meta.db_table,
+		useractions=UserActions._meta.db_table,
+		spottags=SpotTags._meta.db_table,
+		tags=Tags._meta.db_table,
+		point=POINT_SQL
+	)
+
+	with connection.cursor() as db_cursor:
+		db_cursor.execute(sql, {
+			'lat': float(latitude),
+			'lng': float(longitude),
+			'meters': float(max_distance) * 1000,
+			'limit': limit
+		})
+		result = db_cursor.fetchall()
+
+	return [
+		{'id': tag_id, 'name': name, 'usage_count': usage_count}
+		for tag_id, name, usage_count in result
+	]
@@ -1,3 +1,135 @@
-from django.test import TestCase
+import struct
 
-# Create your tests here.
+from django.test import SimpleTestCase
+from rest_framework.response import Response
+
+from .compact import MICRODEGREES, encode_polyline, pack_int32
+from .renderers import NearbyInt32Renderer
+from .spatial_index import SpotsGridIndex, haversine
+
+class SpotsGridIndexTests(SimpleTestCase):
+
+	def setUp(self):
+		self.index = SpotsGridIndex(cell_size=0.05, max_spots=100)
+
+	def nearby_ids(self, lat, lng, meters):
+		return [self.index.ids[slot] for slot in self.index.nearby(lat, lng, meters)]
+
+	def test_nearby_within_radius(self):
+		self.index.add(1, 10, 10.4806, -66.9036)
+		self.index.add(2, 10, 10.4900, -66.9036)
+		self.index.add(3, 10, 10.6000, -66.9036)
+
+		self.assertEqual(self.nearby_ids(10.4806, -66.9036, 2000), [1, 2])
+
+	def test_nearby_across_antimeridian(self):
+		self.index.add(1, 10, 0, 179.999)
+		self.index.add(2, 10, 0, -179.999)
+		self.index.add(3, 10, 0, 179.9)
+
+		self.assertEqual(self.nearby_ids(0, 179.9995, 1000), [1, 2])
+		self.assertEqual(self.nearby_ids(0, -179.9995, 1000), [1, 2])
+
+	def test_nearby_around_the_poles(self):
+		# About 222 meters apart, on opposite sides of the north pole
+		self.index.add(1, 10, 89.999, 10)
+		self.index.add(2, 10, -89.999, 10)
+
+		self.assertLess(haversine(89.999, -170, 89.999, 10), 1000)
+		self.assertEqual(self.nearby_ids(89.999, -170, 1000), [1])
+		self.assertEqual(self.nearby_ids(-89.999, -170, 1000), [2])
+
+	def test_move_spot(self):
+		self.index.add(1, 10, 10, 10)
+		self.index.add(1, 10, 20, 20)
+
+		self.assertEqual(self.nearby_ids(10, 10, 1000), [])
+		self.assertEqual(self.nearby_ids(20, 20, 1000), [1])
+		self.assertEqual(self.index.stats()['spots'], 1)
+		self.assertEqual(self.index.stats()['tombstones'], 1)
+
+	def test_remove_spot_leaves_tombstone(self):
+		self.index.add(1, 10, 10, 10)
+		self.index.add(2, 10, 10, 10.001)
+		self.index.remove(1)
+		self.index.remove(3)
+
+		self.assertEqual(self.nearby_ids(10, 10, 1000), [2])
+		self.assertEqual(self.index.stats()['spots'], 1)
+		self.assertEqual(self.index.stats()['tombstones'], 1)
+
+	def test_nearby_places_of_user(self):
+		self.index.add(1, 10, 10, 10)
+		self.index.add(2, 20, 10, 10.001)
+
+		self.assertEqual(self.index.nearby_places(10, 10, 1, 20), [
+			{'id': 1, 'lat': 10.0, 'lng': 10.0},
+			{'id': 2, 'lat': 10.0, 'lng': 10.001},
+		])
+		self.assertIsNone(self.index.nearby_places(10, 10, 1, 30))
+
+	def test_overflow(self):
+		index = SpotsGridIndex(cell_size=0.05, max_spots=1)
+		index.add(1, 10, 10, 10)
+		index.add(2, 10, 10, 10)
+
+		self.assertTrue(index.overflow)
+
+def decode_polyline(polyline, precision=5):
+	'''
+	(lat, lng) points of a Google encoded polyline
+	'''
+	values = []
+	value = shift = 0
+	for char in polyline:
+		chunk = ord(char) - 63
+		value |= (chunk & 0x1f) << shift
+		shift += 5
+		if chunk < 0x20:
+			values.append(~(value >> 1) if value & 1 else value >> 1)
+			value = shift = 0
+
+	points = []
+	lat = lng = 0
+	for i in range(0, len(values), 2):
+		lat += values[i]
+		lng += values[i + 1]
+		points.append((lat / 10 ** precision, lng / 10 ** precision))
+	return points
+
+class CompactEncodingTests(SimpleTestCase):
+
+	points = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453), (0, 0), (-89.99999, 179.99999)]
+
+	def test_encode_polyline_known_value(self):
+		# Example of the Google encoded polyline documentation
+		self.assertEqual(encode_polyline(self.points[:3]), '_p~iF~ps|U_ulLnnqC_mqNvxq`@')
+
+	def test_encode_polyline_round_trip(self):
+		self.assertEqual(decode_polyline(encode_polyline(self.points)), [
+			(float(lat), float(lng)) for lat, lng in self.points
+		])
+		self.assertEqual(decode_polyline(encode_polyline([(10.123456, -66.987654)])), [(10.12346, -66.98765)])
+		self.assertEqual(encode_polyline([]), '')
+
+	def test_pack_int32_round_trip(self):
+		ids = [1, 2, 2 ** 31 - 1, 4, 5]
+		buffer = pack_int32(ids, self.points)
+
+		self.assertEqual(len(buffer), 4 + 4 * len(ids) * 3)
+		count, = struct.unpack_from('<I', buffer)
+		values = struct.unpack_from('<%si' % (count * 3), buffer, 4)
+		self.assertEqual(list(values[:count]), ids)
+		self.assertEqual(
+			[(values[i] / MICRODEGREES, values[i + 1] / MICRODEGREES) for i in range(count, len(values), 2)],
+			[(float(lat), float(lng)) for lat, lng in self.points]
+		)
+		self.assertEqual(pack_int32([], []), b'\x00\x00\x00\x00')
+
+	def test_int32_renderer_errors_are_json(self):
+		response = Response()
+		response['Content-Type'] = NearbyInt32Renderer.media_type
+		content = NearbyInt32Renderer().render({'error': 'Not found'}, renderer_context={'response': response})
+
+		self.assertEqual(content, b'{"error": "Not found"}')
+		self.assertEqual(response['Content-Type'], 'application/json')
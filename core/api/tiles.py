@@ -0,0 +1,96 @@
+import math
+
+from django.core.cache import cache
+from django.db import connection
+
+from core.settings import (tiles_max_zoom,tiles_cache_timeout,
+	tiles_max_features)
+
+# Half the side of the EPSG:3857 square, in meters
+WEB_MERCATOR_EXTENT = 20037508.342789244
+
+TILE_SQL = '''
+	WITH bounds AS (
+		SELECT ST_MakeEnvelope(%(xmin)s, %(ymin)s, %(xmax)s, %(ymax)s, 3857) AS geom
+	),
+	features AS (
+		SELECT ST_AsMVTGeom(ST_Transform(s.position, 3857), bounds.geom) AS geom,
+			s.id,
+			s.name,
+			(
+				SELECT string_agg(t.name, ',' ORDER BY t.name)
+				FROM api_useractions ua
+				JOIN api_spottags st ON st.user_action_id = ua.id
+				JOIN api_tags t ON t.id = st.tag_id
+				WHERE ua.spot_id = s.id
+					AND ua.type_user_action_id = 1
+					AND ua.is_active AND NOT ua.is_deleted
+					AND st.is_active AND NOT st.is_deleted
+			) AS tags
+		FROM api_spots s, bounds
+		WHERE s.position && ST_Transform(bounds.geom, 4326)
+			AND s.is_active AND NOT s.is_deleted
+		LIMIT %(limit)s
+	)
+	SELECT ST_AsMVT(features, 'spots', 4096, 'geom') FROM features
+'''
+
+def tile_bounds(z, x, y):
+	'''
+	Return the (xmin, ymin, xmax, ymax) bounds in EPSG:3857 of a tile
+	'''
+	size = 2 * WEB_MERCATOR_EXTENT / (2 ** z)
+	xmin = -WEB_MERCATOR_EXTENT + x * size
+	ymax = WEB_MERCATOR_EXTENT - y * size
+	return xmin, ymax - size, xmin + size, ymax
+
+def tile_for_point(lat, lng, z):
+	'''
+	Return the (x, y) of the tile that contains a point at zoom z
+	'''
+	lat = max(min(float(lat), 85.0511), -85.0511)
+	n = 2 ** z
+	x = int((float(lng) + 180.0) / 360.0 * n)
+	y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+	return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+def tile_cache_key(z, x, y):
+	return 'spots_tile:{}:{}:{}'.format(z, x, y)
+
+def render_tile(z, x, y):
+	'''
+	Return the Mapbox Vector Tile with the active spots of a tile,
+	from the cache when it's available
+	'''
+	key = tile_cache_key(z, x, y)
+	tile = cache.get(key)
+
+	if tile is None:
+		xmin, ymin, xmax, ymax = tile_bounds(z, x, y)
+
+		with connection.cursor() as cursor:
+			cursor.execute(TILE_SQL, {
+				'xmin': xmin,
+				'ymin': ymin,
+				'xmax': xmax,
+				'ymax': ymax,
+				'limit': tiles_max_features
+			})
+			row = cursor.fetchone()
+
+		tile = bytes(row[0]) if row and row[0] is not None else b''
+		cache.set(key, tile, tiles_cache_timeout)
+
+	return tile
+
+def invalidate_spot_tiles(spot):
+	'''
+	Drop the cached tiles that contain the spot, at every zoom level
+	'''
+	if spot.lat is None or spot.lng is None:
+		return
+
+	cache.delete_many([
+		tile_cache_key(z, *tile_for_point(spot.lat, spot.lng, z))
+		for z in range(tiles_max_zoom + 1)
+	])
@@ -16,10 +16,15 @@ router.register('api/spot_tags', SpotTagsViewSet, 'spot_tags')
 urlpatterns = [
     url(r'^api/spots/user_places/$', SpotsViewSet.as_view({'post': 'user_places'}), name='user_places'),
     url(r'^api/spots/nearby_places/$', SpotsViewSet.as_view({'post': 'nearby_places'}), name='nearby_places'),
+    url(r'^api/spots/batch_nearby_places/$', SpotsViewSet.as_view({'post': 'batch_nearby_places'}), name='batch_nearby_places'),
     url(r'^api/spots/create_spot/$', SpotsViewSet.as_view({'post': 'create_spot'}), name='create_spot'),
     url(r'^api/spots/delete_spot/$', SpotsViewSet.as_view({'post': 'destroy_spot'}), name='destroy_spot'),
+    url(r'^api/spots/bulk_delete_spots/$', SpotsViewSet.as_view({'post': 'bulk_delete_spots'}), name='bulk_delete_spots'),
     url(r'^api/spots/spot_details/$', SpotsViewSet.as_view({'post': 'spot_details'}), name='spot_details'),
     url(r'^api/spots/edit_spot/$', SpotsViewSet.as_view({'post': 'edit_spot'}), name='edit_spot'),
+    url(r'^api/spots/viewport_clusters/$', SpotsViewSet.as_view({'post': 'viewport_clusters'}), name='viewport_clusters'),
+    url(r'^api/spots/viewport_spots/$', SpotsViewSet.as_view({'post': 'viewport_spots'}), name='viewport_spots'),
+    url(r'^api/spots/tiles/(?P<z>\d+)/(?P<x>\d+)/(?P<y>\d+)\.mvt$', SpotsViewSet.as_view({'get': 'tiles'}), name='spot_tiles'),
 ]
 
 urlpatterns += router.urls
@@ -34,6 +34,124 @@ defaultLng = config.get('googleMapsConf', 'defaultLng')
 
 # GEOSGeometry Config
 max_distance = config.get('GEOSGeometryConf', 'max_distance')
+try:
+    knn_max_k = config.getint('GEOSGeometryConf', 'knn_max_k')
+except Exception as e:
+    knn_max_k = 100
+try:
+    cluster_cell_pixels = config.getint('GEOSGeometryConf', 'cluster_cell_pixels')
+except Exception as e:
+    cluster_cell_pixels = 60
+try:
+    cluster_max = config.getint('GEOSGeometryConf', 'cluster_max')
+except Exception as e:
+    cluster_max = 5000
+try:
+    stream_chunk_size = config.getint('GEOSGeometryConf', 'stream_chunk_size')
+except Exception as e:
+    stream_chunk_size = 2000
+try:
+    batch_max_probes = config.getint('GEOSGeometryConf', 'batch_max_probes')
+except Exception as e:
+    batch_max_probes = 50
+try:
+    batch_max_rows = config.getint('GEOSGeometryConf', 'batch_max_rows')
+except Exception as e:
+    batch_max_rows = 5000
+try:
+    tags_filter_max = config.getint('GEOSGeometryConf', 'tags_filter_max')
+except Exception as e:
+    tags_filter_max = 10
+
+# In-process spatial index Config
+try:
+    spatial_index_enabled = config.getboolean('spatialIndexConf', 'enabled')
+except Exception as e:
+    spatial_index_enabled = False
+try:
+    spatial_index_cell_size = config.getfloat('spatialIndexConf', 'cell_size')
+except Exception as e:
+    spatial_index_cell_size = 0.05
+try:
+    spatial_index_max_spots = config.getint('spatialIndexConf', 'max_spots')
+except Exception as e:
+    spatial_index_max_spots = 1000000
+try:
+    spatial_index_check_interval = config.getint('spatialIndexConf', 'check_interval')
+except Exception as e:
+    spatial_index_check_interval = 60
+
+# Mapbox Vector Tiles Config
+try:
+    tiles_max_zoom = config.getint('mvtConf', 'max_zoom')
+except Exception as e:
+    tiles_max_zoom = 22
+try:
+    tiles_cache_timeout = config.getint('mvtConf', 'cache_timeout')
+except Exception as e:
+    tiles_cache_timeout = 3600
+try:
+    tiles_max_features = config.getint('mvtConf', 'max_features')
+except Exception as e:
+    tiles_max_features = 50000
+
+# Reverse geocoding Config
+try:
+    geocoder_timeout = config.getint('geocoderConf', 'timeout')
+except Exception as e:
+    geocoder_timeout = 3
+try:
+    geocoder_cache_precision = config.getint('geocoderConf', 'cache_precision')
+except Exception as e:
+    geocoder_cache_precision = 4
+try:
+    geocoder_cache_ttl = config.getint('geocoderConf', 'cache_ttl')
+except Exception as e:
+    geocoder_cache_ttl = 2592000
+try:
+    geocoder_cache_negative_ttl = config.getint('geocoderConf', 'cache_negative_ttl')
+except Exception as e:
+    geocoder_cache_negative_ttl = 86400
+try:
+    geocoder_lru_size = config.getint('geocoderConf', 'lru_size')
+except Exception as e:
+    geocoder_lru_size = 10000
+try:
+    geocoder_wait_budget = config.getfloat('geocoderConf', 'wait_budget')
+except Exception as e:
+    geocoder_wait_budget = 3.0
+try:
+    geocoder_backend = config.get('geocoderConf', 'backend')
+except Exception as e:
+    geocoder_backend = 'nominatim'
+try:
+    geocoder_full_address_backend = config.get('geocoderConf', 'full_address_backend')
+except Exception as e:
+    geocoder_full_address_backend = 'nominatim'
+try:
+    geocoder_boundaries_path = config.get('geocoderConf', 'boundaries_path')
+except Exception as e:
+    geocoder_boundaries_path = ''
+
+# Spots Config
+try:
+    spots_bulk_delete_max = config.getint('spotsConf', 'bulk_delete_max')
+except Exception as e:
+    spots_bulk_delete_max = 1000
+try:
+    spots_page_size_max = config.getint('spotsConf', 'page_size_max')
+except Exception as e:
+    spots_page_size_max = 1000
+
+# Tags Config
+try:
+    tags_autocomplete_max = config.getint('tagsConf', 'autocomplete_max')
+except Exception as e:
+    tags_autocomplete_max = 50
+try:
+    tags_autocomplete_candidates = config.getint('tagsConf', 'autocomplete_candidates')
+except Exception as e:
+    tags_autocomplete_candidates = 200
 
 # Amazon S3 Config
 S3_ACCESS_KEY = config.get('amazonS3Conf', 'S3_ACCESS_KEY')
@@ -114,6 +232,25 @@ DATABASES = {
     }
 }
 
+# Cache shared by all the workers, so an invalidated map tile is dropped
+# for every one of them. The database cache by default, its table is
+# created by the migrations
+try:
+    CACHE_BACKEND = config.get('cacheConf', 'backend')
+except Exception as e:
+    CACHE_BACKEND = 'django.core.cache.backends.db.DatabaseCache'
+try:
+    CACHE_LOCATION = config.get('cacheConf', 'location')
+except Exception as e:
+    CACHE_LOCATION = 'api_cache'
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHE_LOCATION,
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators